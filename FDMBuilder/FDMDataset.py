@@ -1,5 +1,8 @@
 # from google.cloud import bigquery
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from FDMBuilder.FDMTable import *
+
+DATA_DICT_CONCURRENCY = 8
     
     
 class FDMDataset:
@@ -33,7 +36,9 @@ class FDMDataset:
     
     
     def build(self, extract_end_date, excluded_tables=[], 
-              includes_pre_natal=False):
+              includes_pre_natal=False, approximate_data_dicts=False,
+              data_dict_sample_percent=None, 
+              data_dict_concurrency=DATA_DICT_CONCURRENCY):
         """Builds the FDM dataset
         
         Simply requires that the dataset specified when initialising the 
@@ -46,6 +51,14 @@ class FDMDataset:
                 dated within pre-natal period before birth (300 days) are 
                 removed, False, or kept, True,  when generating the problem 
                 tables
+            approximate_data_dicts: bool (default False), if True data 
+                dictionary statistics are approximated - much quicker/cheaper 
+                for very large tables, see `FDMTable.build_data_dict`
+            data_dict_sample_percent: float (default None), if set, data 
+                dictionary statistics are calculated from a random sample of 
+                roughly this percentage of each table
+            data_dict_concurrency: int (default DATA_DICT_CONCURRENCY), max 
+                number of data dictionaries built at the same time
         
         Returns:
             None - all changes in GCP
@@ -73,7 +86,9 @@ class FDMDataset:
         print("5. Building observation_period table\n")
         self._build_observation_period_table()
         print("6. Building data dictionaries\n")
-        self._build_data_dictionaries()
+        self._build_data_dictionaries(approximate_data_dicts, 
+                                      data_dict_sample_percent,
+                                      data_dict_concurrency)
         print("_" * 80 + "\n")
         print(f"\t ##### BUILD PROCESS FOR {self.dataset_id} COMPLETE! #####\n")
         
@@ -85,22 +100,83 @@ class FDMDataset:
             None - all changes in GCP
         """
         try:
-            CLIENT.get_dataset(self.dataset_id)
+            SESSION.get_dataset(self.dataset_id)
             print(f"Dataset {self.dataset_id} already exists!")
         except:
             dataset = bigquery.Dataset(f"{PROJECT}.{self.dataset_id}")
             dataset.location = "europe-west2"
-            CLIENT.create_dataset(dataset, timeout=30)
+            SESSION.create_dataset(dataset, timeout=30)
+            invalidate_dataset_metadata(self.dataset_id)
             print(f"Dataset {self.dataset_id} created")
         
     
+    def add_parsed_dates_to_tables(self, table_date_specs, batch_size=None,
+                                   n_workers=None):
+        """Adds parsed date columns to several tables in the dataset at once
+        
+        Equivalent to calling `FDMTable._add_parsed_dates_to_table` for each 
+        table, except the raw date values BigQuery can't parse are collected 
+        from all the tables in a single query, each distinct value is parsed 
+        once however many tables it appears in, and one shared raw -> parsed 
+        lookup table is uploaded that every table joins against.
+        
+        Args:
+            table_date_specs: dict, FDMTable: list of (date_cols, date_format, 
+                date_column_name) tuples pairs - see 
+                `FDMTable._add_parsed_dates_to_table`. All tables must be in 
+                this dataset
+            batch_size: int (default None), if set, dates that need parsing in
+                python are streamed in batches of at most batch_size rows (see 
+                `upload_parsed_dates`) rather than read all at once
+            n_workers: int (default None), number of processes used to parse 
+                dates with the dateutil parser - defaults to available CPUs
+                
+        Returns:
+            dict, FDMTable: list of bools for each date spec - True if parsed 
+                date column successfully added to table, otherwise False
+        """
+        
+        for table in table_date_specs.keys():
+            if table.dataset_id != self.dataset_id:
+                raise ValueError(f"Table {table.full_table_id} isn't in dataset "
+                                 f"{self.dataset_id}")
+        
+        date_plans = {
+            table: table.plan_parsed_dates(date_specs, date_key_prefix=f"{i}_")
+            for i, (table, date_specs) in enumerate(table_date_specs.items())
+        }
+        unparsed_dates_sql = [
+            f"SELECT * FROM ({date_plan['unparsed_dates_sql']})"
+            for date_plan in date_plans.values()
+            if date_plan["unparsed_dates_sql"]
+        ]
+        temp_dates_id = f"{PROJECT}.{self.dataset_id}.tmp_dates"
+        parsed_date_keys = set()
+        if unparsed_dates_sql:
+            parsed_date_keys = upload_parsed_dates(
+                "\nUNION DISTINCT\n".join(unparsed_dates_sql), 
+                temp_dates_id, 
+                batch_size=batch_size, 
+                n_workers=n_workers
+            )
+        
+        dates_added = {}
+        for table, date_plan in date_plans.items():
+            dates_added[table] = table.join_parsed_dates(
+                date_plan, temp_dates_id, parsed_date_keys
+            )
+        if parsed_date_keys:
+            SESSION.delete_table(temp_dates_id)
+        return dates_added
+        
+    
     def _get_fdm_tables(self, excluded_tables):
         """Generates FDMTable objects for every source table in dataset
             
         Collects all non-standard FDM tables in dataset i.e. the source datasets,
-        checks if they're ready for an FDM build (see `.check_build()` method of
-        FDMTable for more info) stores FDMTable objects for each as a list in a 
-        `tables` attribute, for use in rest of build process.
+        checks if they're ready for an FDM build (see `_get_build_checks`) 
+        stores FDMTable objects for each as a list in a `tables` attribute, for 
+        use in rest of build process.
         
         Returns:
             bool, True if all tables are ready for FDM build, otherwise False
@@ -109,19 +185,23 @@ class FDMDataset:
         standard_tables = ["person", "observation_period"]
         fdm_src_tables = []
         build_ready = True
-        for table in CLIENT.list_tables(self.dataset_id):
-            is_standard_table = table.table_id in standard_tables
-            is_problem_table = "fdm_problems" in table.table_id
-            is_data_dict = "data_dict" in table.table_id
-            is_excluded = table.table_id in excluded_tables
-            if is_standard_table or is_problem_table or is_data_dict or is_excluded:
+        build_checks = self._get_build_checks()
+        for table_id, checks in build_checks.items():
+            is_standard_table = table_id in standard_tables
+            is_problem_table = "fdm_problems" in table_id
+            is_data_dict = "data_dict" in table_id
+            is_tmp_table = table_id.endswith("_fdm_tmp")
+            is_excluded = table_id in excluded_tables
+            if (is_standard_table or is_problem_table or is_data_dict 
+                    or is_tmp_table or is_excluded):
                 continue
             fdm_table = FDMTable(
-                source_table_id = (f"{self.dataset_id}.{table.table_id}"),
-                dataset_id = self.dataset_id
+                source_table_id = (f"{self.dataset_id}.{table_id}"),
+                dataset_id = self.dataset_id,
+                validate = False
             )
             (exists, has_person_id, person_id_is_int, has_fdm_start, 
-             has_fdm_end, has_problem_table) = fdm_table.check_build()
+             has_fdm_end, has_problem_table) = checks
             if not np.all([has_person_id, person_id_is_int, has_fdm_start]):
                 person_missing = ("\n\t* no person_id column present" 
                                   if not has_person_id else "")
@@ -132,9 +212,9 @@ class FDMDataset:
                                  if not has_fdm_start else "")
                 errors = person_missing + person_not_int + start_missing
                 print(f"""
-    {table.table_id} is not ready for dataset build:\n{errors}
+    {table_id} is not ready for dataset build:\n{errors}
     
-    Complete the table build process for {table.table_id} and then re-run the
+    Complete the table build process for {table_id} and then re-run the
     dataset build -- OR -- if the table doesn't apply to the usual FDM criteria
     e.g. it's a lookup table, then add to the `excluded_tables` argument of 
     `.build()`.
@@ -144,7 +224,7 @@ class FDMDataset:
                 if has_problem_table:
                     fdm_table.recombine()
                 fdm_end = ' fdm_end_date' if has_fdm_end else ''
-                print(f"    * {table.table_id} contains: "
+                print(f"    * {table_id} contains: "
                       f" - INTEGER person_id - fdm_start_date {fdm_end}"
                       "\n\t-> Table ready")
             fdm_src_tables.append(fdm_table)
@@ -152,6 +232,49 @@ class FDMDataset:
         return build_ready
                 
                 
+    def _get_build_checks(self):
+        """Checks every table in the dataset is ready for an FDM build
+        
+        Equivalent to running `FDMTable.check_build` for every table in the 
+        dataset, but uses one INFORMATION_SCHEMA.TABLES and one 
+        INFORMATION_SCHEMA.COLUMNS query for the whole dataset rather than 
+        several API calls per table.
+        
+        Returns:
+            dict, table id: tuple of the booleans returned by 
+                `FDMTable.check_build` for each table in the dataset
+        """
+        tables_sql = f"""
+            SELECT table_name
+            FROM `{PROJECT}.{self.dataset_id}`.INFORMATION_SCHEMA.TABLES
+            ORDER BY table_name
+        """
+        table_ids = list(SESSION.read_query(tables_sql).table_name)
+        columns_sql = f"""
+            SELECT table_name, column_name, data_type
+            FROM `{PROJECT}.{self.dataset_id}`.INFORMATION_SCHEMA.COLUMNS
+            WHERE column_name IN ("person_id", "fdm_start_date", "fdm_end_date")
+        """
+        columns_df = SESSION.read_query(columns_sql)
+        fdm_columns = {
+            (row.table_name, row.column_name): row.data_type 
+            for row in columns_df.itertuples(index=False)
+        }
+        
+        build_checks = {}
+        for table_id in table_ids:
+            person_id_type = fdm_columns.get((table_id, "person_id"))
+            build_checks[table_id] = (
+                True,
+                person_id_type is not None,
+                person_id_type == "INT64",
+                (table_id, "fdm_start_date") in fdm_columns,
+                (table_id, "fdm_end_date") in fdm_columns,
+                f"{table_id}_fdm_problems" in table_ids
+            )
+        return build_checks
+                
+                
     def _build_person_table(self):
         """Builds person table for dataset
         
@@ -234,18 +357,35 @@ class FDMDataset:
               "entries\n")
         
         
-    def _build_data_dictionaries(self):
+    def _build_data_dictionaries(self, approximate=False, sample_percent=None,
+                                 concurrency=DATA_DICT_CONCURRENCY):
         """Builds a data dict in GCP for each source table
         
-        Simply takes all the tables in the `tables` attribute and calls the 
-        `build_data_dict` method for each 
+        Takes all the tables in the `tables` attribute and calls the 
+        `build_data_dict` method for each, running up to concurrency at the 
+        same time - so the whole stage takes roughly as long as the slowest 
+        table rather than the sum of all of them.
+        
+        Args:
+            approximate: bool (default False), see `FDMTable.build_data_dict`
+            sample_percent: float (default None), see 
+                `FDMTable.build_data_dict`
+            concurrency: int (default DATA_DICT_CONCURRENCY), max number of 
+                data dictionaries built at the same time
         
         Returns:
             None - all changes in GCP
         """
-        for table in self.tables:
-            table.build_data_dict()
-            print(f"    * {table.table_id}_data_dict built")
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {
+                executor.submit(table.build_data_dict, 
+                                approximate=approximate, 
+                                sample_percent=sample_percent): table
+                for table in self.tables
+            }
+            for future in as_completed(futures):
+                future.result()
+                print(f"    * {futures[future].table_id}_data_dict built")
         
         
     def _add_problem_entries_column_to_table(self, table, extract_end_date, 
@@ -406,7 +546,7 @@ class FDMDataset:
             ORDER BY person_id
         """
 
-        run_sql_query(problem_tab_sql, destination=table.full_table_id)
+        table._write_table(problem_tab_sql, materialize=True)
             
             
     def _split_problem_entries_from_src_tables(self,  extract_end_date, 
@@ -1,22 +1,52 @@
 # from google.cloud import bigquery
+import contextlib
 import datetime
-from dateutil.parser import parse
 from FDMBuilder.FDM_helpers import *
-from google.cloud import bigquery
-from google.cloud.exceptions import NotFound
-import numpy as np
-import pandas as pd
+from FDMBuilder.date_helpers import *
+import json
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning)
 warnings.filterwarnings("ignore", category=SyntaxWarning)
 
 # Set global variables 
 PROJECT = "yhcr-prd-phm-bia-core"
-CLIENT = bigquery.Client(project=PROJECT)
 DEMOGRAPHICS = f"{PROJECT}.CB_STAGING_DATABASE.src_DemoGraphics_MASTER"
 MASTER_PERSON = f"{PROJECT}.CB_FDM_MASTER.person"
+DATA_DICT_SCHEMA = [{"name":"variable_name", "type":"STRING"},
+                    {"name":"data_type", "type":"STRING"},
+                    {"name":"description", "type":"STRING"},
+                    {"name":"approximate_stats", "type":"STRING"}]
+# max length of a BigQuery table description
+MAX_DESCRIPTION_LENGTH = 16384
 
     
+class ColumnBatch:
+    """Context manager for a batch of column changes, see `FDMTable.batch`
+    
+    Commits the table's recorded column changes at the end of the `with` 
+    block, or discards them if an error is raised inside it.
+    
+    Args:
+        table: FDMTable, the table the changes are made to
+        
+    Attributes:
+        table: the table the changes are made to
+    """
+    
+    def __init__(self, table):
+        self.table = table
+        
+    def __enter__(self):
+        return self.table
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.table.commit()
+        else:
+            self.table.discard()
+        return False
+    
+    
 class FDMTable:
     """A Tool for preparing individual source tables for FDM build
     
@@ -33,24 +63,28 @@ class FDMTable:
         source_table_id: string, id of source table in GCP. Can be in format
             project_id.dataset_id.table_id or dataset_id.table_id
         dataset_id: string, id of dataset in GCP where FDM is to be built
+        validate: bool (default True), checks the source table and dataset 
+            exist - can be skipped when they're already known to exist
         
     Attributes:
         source_table_full_id: Full id of source table in GCP
         dataset_id = id of dataset where table is to be built in GCP
         table_id = id of table alone i.e. without dataset/project id
         full_table_id = id of table with project and datatset ids i.e. in
-            project_id.dataset_id.table_id format
+            project_id.dataset_id.table_id format - the table can start out 
+            as a view of the source table that `quick_build` materializes
+            (see `copy_table_to_dataset`)
     """
     
     
-    def __init__(self, source_table_id, dataset_id):
+    def __init__(self, source_table_id, dataset_id, validate=True):
             
-        if not check_table_exists(source_table_id):
+        if validate and not check_table_exists(source_table_id):
             raise ValueError(f"""
     {source_table_id} doesn't exist. Be sure to include the dataset id 
     (i.e. DATASET.TABLE) and double check spelling is correct.
             """)
-        if not check_dataset_exists(dataset_id):
+        if validate and not check_dataset_exists(dataset_id):
             raise ValueError(f"""
     Dataset {dataset_id} doesn't exist. Double check spelling and GCP then 
     try again.
@@ -82,6 +116,97 @@ class FDMTable:
             f"\tFollow the guidance provided above and then re-run .build() when you've\n"
             f"\tresolved the issues preventing the build from completing."
         )
+        self._read_table_id_override = None
+        self._pending_operations = None
+        
+    @property
+    def _read_table_id(self):
+        """Full id of the table queries reading the table's data should read
+        
+        The copy of the table in the dataset unless the table's data is being 
+        read from elsewhere, see `_reading_from`.
+        """
+        return self._read_table_id_override or self.full_table_id
+    
+    @contextlib.contextmanager
+    def _reading_from(self, table_id):
+        """Context manager - reads the table's data from another table
+        
+        Inside the `with` block, helpers that read the table's schema or data
+        (e.g. `_get_table_schema_dict`, `_get_date_sample`, 
+        `_get_parsed_date_src_sql`) read table_id instead of the copy in the 
+        dataset, so that a build can be planned against the source table 
+        before the copy exists. Changes are still written to the copy.
+        
+        Args:
+            table_id: string, full id of the table to read
+        """
+        self._read_table_id_override = table_id
+        try:
+            yield
+        finally:
+            self._read_table_id_override = None
+            
+    def _is_view(self):
+        """Checks if the table is (still) a view of the source table
+        
+        Returns:
+            bool, True if the table is a view, otherwise False
+        """
+        table = get_table_metadata(self.full_table_id)
+        return table is not None and table.table_type == "VIEW"
+    
+    def _write_table(self, sql, materialize=False):
+        """Replaces the table with the results of a query
+        
+        If the table is a view and materialize is False the view is redefined
+        to return the query results, so no data is read or written. The 
+        view's current query is put in place of any references to the table in
+        the query, so the new view still reads straight from the source table
+        however many times it's redefined. Otherwise the query results are 
+        written to a physical table - materializing the table in one pass 
+        over the source if it was a view.
+        
+        Args:
+            sql: string, SQL query returning the new table - can read the table 
+                itself (referenced by its `quoted` full id)
+            materialize: bool (default False), if True the results are always
+                written to a physical table
+                
+        Returns:
+            None - changes occurr in GCP
+        """
+        table = get_table_metadata(self.full_table_id)
+        if table is None or table.table_type != "VIEW":
+            run_sql_query(sql, destination=self.full_table_id)
+            return
+        sql = sql.replace(f"`{self.full_table_id}`", 
+                          f"(\n{table.view_query}\n)")
+        if materialize:
+            # a query result can't replace a view, so the results are written 
+            # to a temporary table and only swapped in for the view once the 
+            # query has succeeded - the temporary table is kept if the copy 
+            # fails, so the results aren't lost
+            tmp_table_id = f"{self.full_table_id}_fdm_tmp"
+            run_sql_query(sql, destination=tmp_table_id)
+            SESSION.delete_table(self.full_table_id)
+            SESSION.copy_table(tmp_table_id, self.full_table_id)
+            SESSION.delete_table(tmp_table_id)
+        else:
+            run_sql_query(f"CREATE OR REPLACE VIEW `{self.full_table_id}` AS\n"
+                          f"{sql}")
+            
+    def materialize(self):
+        """Writes the table out as a physical table if it's still a view
+        
+        See `copy_table_to_dataset`. Requires no arguments.
+        
+        Returns:
+            None - changes occurr in GCP
+        """
+        if self._is_view():
+            self._write_table(f"SELECT * FROM `{self.full_table_id}`", 
+                              materialize=True)
         
     def _check_table_exists_in_dataset(func):
         """Decorator Function - ensures a copy of dataset exists
@@ -90,7 +215,7 @@ class FDMTable:
         dataset to work.
         """
         def return_fn(self, *args, **kwargs):
-            if not check_table_exists(self.full_table_id):
+            if not check_table_exists(self._read_table_id):
                 raise ValueError(f"""
     A copy of {self.full_table_id} doesn't yet exist in f"{self.dataset_id}.
     Try running .copy_table_to_dataset() and then try again """)
@@ -204,12 +329,20 @@ class FDMTable:
     @_check_problems_table_doesnt_exist
     def quick_build(self, fdm_start_date_cols, fdm_start_date_format,
                     fdm_end_date_cols=None, fdm_end_date_format=None,
-                    verbose=True):
+                    verbose=True, date_batch_size=None, date_parse_workers=None,
+                    check_date_formats=True):
         """Performs the table build process without verbose user input
 
         Adds the 3 basic FDM table features:  1. A person_id column  2. An Event 
         start date - parsed into a DATETIME 3. An Event end date 
         (if required) without console input used in `build` method.
+        
+        The whole build is planned against the source table (or the existing
+        copy of it in the dataset) and the copy is then written by a single 
+        query that reads the source once, adding/casting person_id and adding
+        the parsed date columns. If the existing copy is a view (see 
+        `copy_table_to_dataset`) the view's changes are applied in the same 
+        query, so the table is materialized in a single pass.
 
         Args:
             fdm_start_date_cols: string/list, name of individual column that 
@@ -230,30 +363,68 @@ class FDMTable:
                 None/left blank if fdm_end_date_cols is blank
             verbose: bool (default True), controls console output showing progress 
                 of build
+            date_batch_size: int (default None), if set, dates that need 
+                parsing in python are streamed in batches of at most this many 
+                rows to keep memory use flat for very large tables
+            date_parse_workers: int (default None), number of processes used to
+                parse dates with the dateutil parser - defaults to the number of
+                available CPUs
+            check_date_formats: bool (default True), checks the date formats 
+                against a sample of dates (see `_check_date_format`) before any
+                changes are made to the table, raising an error if they look
+                wrong
                 
         Returns:
             None - all changes occurr in GCP
         """
         if verbose:
             print(f"Building {self.table_id}:")
-        self.copy_table_to_dataset(verbose=verbose)
-        self._add_person_id_to_table(verbose=verbose)
-        fdm_start_date_added = self._add_parsed_date_to_table(
-            date_cols=fdm_start_date_cols,  
-            date_format=fdm_start_date_format,  
-            date_column_name="fdm_start_date"
-        )
-        if fdm_start_date_added:
+        copy_exists = check_table_exists(self.full_table_id)
+        if copy_exists:
+            src_table_id = self.full_table_id
+            if verbose:
+                print(f"    using existing copy of {self.table_id} in " 
+                      f"{self.dataset_id}")
+        else:
+            src_table_id = self.source_table_full_id
+            if verbose:
+                print(f"    {self.table_id} will be copied to {self.dataset_id}")
+        with self._reading_from(src_table_id):
+            if check_date_formats:
+                self._check_date_format(fdm_start_date_cols, 
+                                        fdm_start_date_format)
+                if fdm_end_date_cols is not None:
+                    self._check_date_format(fdm_end_date_cols, 
+                                            fdm_end_date_format)
+            person_id_sql, identifier = self._get_person_id_sql(verbose=verbose)
+            if person_id_sql is not None:
+                src_table_sql = f"({person_id_sql})"
+            elif not copy_exists:
+                src_table_sql = f"`{src_table_id}`"
+            else:
+                src_table_sql = None
+            if identifier is not None:
+                self._check_person_id_joined(src_table_sql)
+            date_specs = [(fdm_start_date_cols, fdm_start_date_format, 
+                           "fdm_start_date")]
+            if fdm_end_date_cols is not None:
+                date_specs.append((fdm_end_date_cols, fdm_end_date_format, 
+                                   "fdm_end_date"))
+            dates_added = self._add_parsed_dates_to_table(
+                date_specs,
+                batch_size=date_batch_size,
+                n_workers=date_parse_workers,
+                src_table_sql=src_table_sql
+            )
+        self.materialize()
+        if verbose and identifier is not None:
+            print("    person_id column added")
+        if dates_added[0]:
             print("    fdm_start_date column added")
         else:
             print("    fdm_start_date could not be parsed with inputs provided")
         if fdm_end_date_cols is not None:
-            fdm_end_date_added = self._add_parsed_date_to_table(
-                date_cols=fdm_end_date_cols,  
-                date_format=fdm_end_date_format,  
-                date_column_name="fdm_end_date"
-            )
-            if fdm_end_date_added:
+            if dates_added[1]:
                 print("    fdm_end_date column added")
             else:
                 print("    fdm_end_date could not be parsed with inputs provided")
@@ -270,8 +441,7 @@ class FDMTable:
             list, strings detailing each column name
         """
         
-        table = CLIENT.get_table(self.full_table_id)
-        return [field.name for field in table.schema]
+        return list(get_table_schema_dict(self._read_table_id).keys())
             
             
     @_check_table_exists_in_dataset
@@ -297,16 +467,87 @@ class FDMTable:
         Returns:
             dict, column name: colum data type pairs 
         """
-        table = CLIENT.get_table(self.full_table_id)
-        return {field.name: field.field_type  
-                for field in table.schema}
+        return get_table_schema_dict(self._read_table_id)
                                                                                                           
     
+    @_check_table_exists_in_dataset
+    @_check_problems_table_doesnt_exist
+    def batch(self):
+        """Defers column changes so they're all made in one rewrite
+        
+        After calling `batch`, `add_column`, `drop_column` and `rename_columns`
+        just record the change rather than running it. `commit` then makes all
+        the recorded changes with a single query (see 
+        `build_column_operations_sql`), so the table is only rewritten once 
+        rather than once per change. Can be used in a `with` block, in which 
+        case the changes are committed at the end of the block (or discarded
+        if an error is raised inside it). Changes aren't visible e.g. in 
+        `head` or `get_column_names` until they're committed.
+        
+        Returns:
+            ColumnBatch, context manager that commits the changes when its 
+                `with` block ends
+            
+        Example:
+        ```python
+        with my_table.batch():
+            my_table.add_column("integer_col * 100 AS integer_col_x_100")
+            my_table.drop_column("integer_col")
+            my_table.rename_columns({"old_name": "new_name"})
+        # table is rewritten once here
+        
+        # or
+        my_table.batch()
+        my_table.add_column("integer_col * 100 AS integer_col_x_100")
+        my_table.drop_column("integer_col")
+        my_table.commit()
+        ```
+        """
+        if self._pending_operations is not None:
+            raise ValueError(f"A batch of changes to {self.table_id} has "
+                             "already been started - run .commit() first")
+        self._pending_operations = []
+        return ColumnBatch(self)
+    
+    
+    def commit(self, verbose=False):
+        """Makes the column changes recorded since `batch` was called
+        
+        Args:
+            verbose: bool (default False), prints a summary of the changes
+            
+        Returns:
+            None - changes occurr in GCP
+        """
+        operations = self._pending_operations or []
+        self._pending_operations = None
+        if not operations:
+            return
+        operations_sql = build_column_operations_sql(
+            f"`{self.full_table_id}`", self.get_column_names(), operations
+        )
+        self._write_table(operations_sql)
+        if verbose:
+            print(f"    {len(operations)} changes made to {self.table_id}")
+            
+            
+    def discard(self):
+        """Drops the column changes recorded since `batch` was called
+        
+        Returns:
+            None
+        """
+        self._pending_operations = None
+        
+        
     @_check_table_exists_in_dataset
     @_check_problems_table_doesnt_exist
     def add_column(self, column_sql):
         """Adds a column to the table according to user specification
         
+        If a batch of changes has been started (see `batch`) the column is 
+        added when the batch is committed.
+        
         Args:
             colunm_sql: string, a sql statement that specifies the new
                 column similar to that would see in a standard SELECT statement
@@ -329,11 +570,63 @@ class FDMTable:
         )
         ```
         """
+        if self._pending_operations is not None:
+            self._pending_operations.append(("add", column_sql))
+            return
         add_column_sql = f"""
             SELECT *, {column_sql}
             FROM `{self.full_table_id}`
         """
-        run_sql_query(add_column_sql, destination=self.full_table_id)
+        self._write_table(add_column_sql)
+    
+    
+    @_check_table_exists_in_dataset
+    @_check_problems_table_doesnt_exist
+    def add_columns(self, columns):
+        """Adds several columns to the table in a single rewrite
+        
+        The new columns are checked together with a dry run before anything 
+        is changed, so if any of them is invalid none are added. If a batch of
+        changes has been started (see `batch`) the columns are added when the
+        batch is committed.
+        
+        Args:
+            columns: list/dict, either sql statements that each specify a new 
+                named column (see `add_column`), or new column name: sql 
+                expression pairs
+                
+        Returns:
+            None - changes occurr in GCP
+            
+        Example:
+        
+        ```python
+        my_table.add_columns([
+            "integer_col * 100 AS integer_col_x_100",
+            "SPLIT(string_col, "/")[OFFSET(0)] AS string_col_first_item"
+        ])
+        # or
+        my_table.add_columns({
+            "integer_col_x_100": "integer_col * 100",
+            "string_col_first_item": "SPLIT(string_col, "/")[OFFSET(0)]"
+        })
+        ```
+        """
+        if isinstance(columns, dict):
+            columns = [f"{expression} AS {name}" 
+                       for name, expression in columns.items()]
+        if not columns:
+            return
+        columns_sql = ", ".join(columns)
+        if self._pending_operations is not None:
+            self._pending_operations.append(("add", columns_sql))
+            return
+        add_columns_sql = build_column_operations_sql(
+            f"`{self.full_table_id}`", self.get_column_names(), 
+            [("add", columns_sql)]
+        )
+        dry_run_sql_query(add_columns_sql)
+        self._write_table(add_columns_sql)
     
     
     @_check_table_exists_in_dataset
@@ -341,12 +634,24 @@ class FDMTable:
     def drop_column(self, column):
         """Drops/deletes the specified column
         
+        If a batch of changes has been started (see `batch`) the column is 
+        dropped when the batch is committed.
+        
         Args:
             colunm: string, name of column to be deleted
                 
         Returns:
             None - changes occurr in GCP
         """
+        if self._pending_operations is not None:
+            self._pending_operations.append(("drop", column))
+            return
+        if self._is_view():
+            self._write_table(f"""
+                SELECT * EXCEPT({column})
+                FROM `{self.full_table_id}`
+            """)
+            return
         drop_column_sql = f"""
             ALTER TABLE `{self.full_table_id}`
             DROP COLUMN {column}
@@ -359,9 +664,13 @@ class FDMTable:
     def rename_columns(self, names_map, verbose=True):
         """Renames columns of table
         
+        If a batch of changes has been started (see `batch`) the columns are 
+        renamed when the batch is committed.
+        
         Args:
             names_map: dict, key-value pairs are strings, keys detailing
                 current names, values the new names of the columns
+            verbose: bool (default True), prints each rename
                 
         Returns:
             None - changes occurr in GCP
@@ -375,6 +684,16 @@ class FDMTable:
         )
         ```
         """
+        if self._pending_operations is not None:
+            self._pending_operations.append(("rename", dict(names_map)))
+            return
+        if self._is_view():
+            # views can't be altered, so are redefined with the new names
+            self._write_table(build_column_operations_sql(
+                f"`{self.full_table_id}`", self.get_column_names(), 
+                [("rename", names_map)]
+            ))
+            return
         rename_columns_in_bigquery(table_id=self.full_table_id,
                                    names_map=names_map,
                                    verbose=verbose)
@@ -397,11 +716,12 @@ class FDMTable:
             FROM `{self.full_table_id}`
             LIMIT {n}
         """
-        return pd.read_gbq(head_sql)
+        return SESSION.read_query(head_sql)
     
     
     @_check_table_exists_in_dataset
-    def build_data_dict(self):
+    def build_data_dict(self, approximate=False, sample_percent=None, 
+                        use_cached=True):
         """Creates table with basic data dictionary in table dataset
 
         Generates a "data dictionary" as a separate table in BigQuery named 
@@ -409,87 +729,328 @@ class FDMTable:
         column/variable, the data type of each column/variable and some 
         information on the actual data: if the column is numeric/DateTime a 
         min/max is detailed (plus a mean for non DateTime columns), or some 
-        examples of unique values for non-numeric columns.
+        examples of unique values for non-numeric columns. The statistics for
+        every column are calculated in a single query.
+        
+        For very large tables the statistics can be approximated, which is 
+        much quicker/cheaper, and/or calculated from a random sample of the 
+        table. The approximate_stats column of the data dictionary lists any 
+        statistics in each description that are approximate.
+        
+        The source table's last modified time and row count, and a fingerprint
+        of each column's values, are stored in the data dictionary table's 
+        description. If the table hasn't been modified since the data 
+        dictionary was built nothing is recomputed. If it has been modified 
+        but still has the same number of rows, only entries for columns that 
+        have been added/renamed/retyped or whose values have changed are 
+        recomputed - see `_get_cached_data_dict_entries` for the cost of 
+        checking.
 
-        Requires no arguments.
+        Args:
+            approximate: bool (default False), if True unique counts, min/max 
+                and example values are approximated with APPROX_COUNT_DISTINCT,
+                APPROX_QUANTILES and APPROX_TOP_COUNT
+            sample_percent: float (default None), if set, statistics are 
+                calculated from a TABLESAMPLE of roughly this percentage of the
+                table, so all statistics are approximate
+            use_cached: bool (default True), if False the whole data dictionary
+                is recomputed regardless of any existing data dictionary
                 
         Returns:
             None - changes occurr in GCP
         """
-        schema_dict = self._get_table_schema_dict()
+        if sample_percent is not None and not 0 < sample_percent <= 100:
+            raise ValueError("sample_percent must be between 0 and 100")
+        table = get_table_metadata(self.full_table_id)
+        schema_dict = {field.name: field.field_type for field in table.schema}
+        # a view's modified time doesn't change when its source does
+        source_modified = (table.modified.isoformat() 
+                           if table.table_type == "TABLE" else None)
+        data_dict_info = {"source_modified": source_modified,
+                          "source_num_rows": table.num_rows,
+                          "approximate": approximate,
+                          "sample_percent": sample_percent}
+        data_dict_id = self.full_table_id + "_data_dict"
+        
+        cached_entries = {}
+        if use_cached:
+            cached_entries = self._get_cached_data_dict_entries(data_dict_info, 
+                                                                schema_dict)
+            if cached_entries is None:
+                return None
+        
+        new_schema_dict = {col_name: col_dtype 
+                           for col_name, col_dtype in schema_dict.items()
+                           if col_name not in cached_entries}
+        if new_schema_dict:
+            stats_sql = self._get_data_dict_stats_sql(new_schema_dict, 
+                                                      approximate, 
+                                                      sample_percent)
+            stats_df = SESSION.read_query(stats_sql)
         data_dict = {
             "variable_name": [],
             "data_type": [],
             "description": [],
+            "approximate_stats": [],
         }
+        for i, (col_name, col_dtype) in enumerate(new_schema_dict.items()):
+            cached_entries[col_name] = {
+                "description": self._get_data_dict_description(col_dtype, 
+                                                               stats_df, i),
+                "approximate_stats": self._get_data_dict_approximate_stats(
+                    col_dtype, approximate, sample_percent
+                ),
+                "fingerprint": (int(stats_df[f"fingerprint_{i}"][0]) 
+                                if sample_percent is None 
+                                and pd.notna(stats_df[f"fingerprint_{i}"][0])
+                                else None)
+            }
         for col_name, col_dtype in schema_dict.items():
             data_dict["variable_name"].append(col_name)
             data_dict["data_type"].append(col_dtype)
-            n_unique_values_sql = f"""
-                SELECT COUNT(DISTINCT {col_name}) AS n, 
-                FROM `{self.full_table_id}`
-                WHERE {col_name} IS NOT NULL
-            """
-            n_unique_values_df = pd.read_gbq(n_unique_values_sql)
-            n_unique_values = n_unique_values_df.n[0]
+            for key in ["description", "approximate_stats"]:
+                data_dict[key].append(cached_entries[col_name][key])
+        data_dict_info["fingerprints"] = {
+            col_name: cached_entries[col_name]["fingerprint"] 
+            for col_name in schema_dict.keys()
+            if cached_entries[col_name]["fingerprint"] is not None
+        }
+        description = json.dumps(data_dict_info)
+        if len(description) > MAX_DESCRIPTION_LENGTH:
+            # very wide tables - entries are then only reused while the 
+            # table is unmodified
+            data_dict_info["fingerprints"] = {}
+            description = json.dumps(data_dict_info)
+        data_dict_df = pd.DataFrame(data_dict)
+        SESSION.write_dataframe(data_dict_df, data_dict_id, 
+                                schema=DATA_DICT_SCHEMA,
+                                description=description)
+    
+    
+    def _get_cached_data_dict_entries(self, data_dict_info, schema_dict):
+        """Collects the entries of an existing data dictionary that are valid
+        
+        No entries are valid unless the data dictionary was built with the 
+        same settings and the source table has the same number of rows. Then 
+        if the source table hasn't been modified since, entries for columns 
+        with the same name and type are valid. If it has been modified (or 
+        is a view, so might have been), the fingerprints of those columns are
+        recalculated and only entries for columns whose values haven't changed
+        are valid. Fingerprinting reads every one of those columns in full, so
+        it's billed the same bytes as recomputing their statistics - but the 
+        query is a simple aggregate, so it's much quicker than the distinct 
+        counts/quantiles/example values it saves. Tables rewritten by a 
+        dataset build always need fingerprinting.
+        
+        Args:
+            data_dict_info: dict, source_modified/source_num_rows of the source 
+                table and approximate/sample_percent settings for the new data
+                dictionary
+            schema_dict: dict, column name: column type pairs for the table
+            
+        Returns:
+            dict, column name: dict of description/approximate_stats/fingerprint
+                (None if unknown) for each valid entry -- or -- None if the 
+                existing data dictionary is completely up to date
+        """
+        data_dict_id = self.full_table_id + "_data_dict"
+        try:
+            data_dict_table = SESSION.get_table(data_dict_id)
+            cached_info = json.loads(data_dict_table.description)
+        except (gcp_exceptions.NotFound, TypeError, ValueError):
+            return {}
+        settings = ["approximate", "sample_percent", "source_num_rows"]
+        if any(cached_info.get(key) != data_dict_info[key] for key in settings):
+            return {}
+        
+        cached_fingerprints = cached_info.get("fingerprints", {})
+        cached_data_dict_df = SESSION.read_table(data_dict_table)
+        cached_entries = {
+            row.variable_name: {"description": row.description,
+                                "approximate_stats": row.approximate_stats,
+                                "fingerprint": cached_fingerprints.get(
+                                    row.variable_name
+                                )}
+            for row in cached_data_dict_df.itertuples(index=False)
+            if schema_dict.get(row.variable_name) == row.data_type
+        }
+        table_modified = (data_dict_info["source_modified"] is None or
+                          cached_info.get("source_modified") != 
+                          data_dict_info["source_modified"])
+        if not table_modified:
+            all_cached = (len(cached_entries) == len(schema_dict) and 
+                          len(cached_data_dict_df) == len(schema_dict))
+            return None if all_cached else cached_entries
+        
+        cached_entries = {col_name: entry 
+                          for col_name, entry in cached_entries.items()
+                          if entry["fingerprint"] is not None}
+        if not cached_entries:
+            return {}
+        fingerprints_sql = "SELECT " + ", ".join(
+            f"{self._get_fingerprint_sql(col_name)} AS fingerprint_{i}"
+            for i, col_name in enumerate(cached_entries.keys())
+        ) + f" FROM `{self.full_table_id}`"
+        fingerprints_df = SESSION.read_query(fingerprints_sql)
+        return {col_name: entry 
+                for i, (col_name, entry) in enumerate(cached_entries.items())
+                if fingerprints_df[f"fingerprint_{i}"][0] == entry["fingerprint"]}
+    
+    
+    def _get_fingerprint_sql(self, col_name):
+        """Builds SQL aggregating a column's values into a fingerprint
+        
+        The fingerprint is a sum of hashes of each value, so it doesn't depend 
+        on the order of rows in the table.
+        
+        Args:
+            col_name: string, name of the column
+            
+        Returns:
+            string, SQL aggregate expression returning an INTEGER
+        """
+        return (f"SUM(MOD(FARM_FINGERPRINT(TO_JSON_STRING({col_name})), "
+                "1000000007))")
+    
+    
+    def _get_data_dict_stats_sql(self, schema_dict, approximate=False, 
+                                 sample_percent=None):
+        """Builds one query calculating data dictionary stats for every column
+        
+        For the ith column in schema_dict, the query returns the number of 
+        distinct non-NULL values as n_i, and either min_i/max_i (plus mean_i for
+        non DateTime columns) for numeric/DateTime columns or up to 21 distinct
+        example values as values_i for all other columns - enough to tell if a
+        column has more than the 20 unique values listed in full. Unless the
+        table is sampled, a fingerprint of the column's values (see 
+        `_get_fingerprint_sql`) is also returned as fingerprint_i.
+        
+        Args:
+            schema_dict: dict, column name: column type pairs for the table
+            approximate: bool (default False), see `build_data_dict`
+            sample_percent: float (default None), see `build_data_dict`
             
+        Returns:
+            string, SQL query returning a single row of stats
+        """
+        stats_sql = []
+        for i, (col_name, col_dtype) in enumerate(schema_dict.items()):
+            if approximate:
+                stats_sql.append(f"APPROX_COUNT_DISTINCT({col_name}) AS n_{i}")
+            else:
+                stats_sql.append(f"COUNT(DISTINCT {col_name}) AS n_{i}")
+            if col_dtype in ["INTEGER", "DATETIME", "FLOAT"] and approximate:
+                quantiles_sql = f"APPROX_QUANTILES({col_name}, 2)"
+                stats_sql.append(f"{quantiles_sql}[SAFE_OFFSET(0)] AS min_{i}")
+                stats_sql.append(f"{quantiles_sql}[SAFE_OFFSET(2)] AS max_{i}")
+            elif col_dtype in ["INTEGER", "DATETIME", "FLOAT"]:
+                stats_sql.append(f"MIN({col_name}) AS min_{i}")
+                stats_sql.append(f"MAX({col_name}) AS max_{i}")
+            elif approximate:
+                stats_sql.append(f"APPROX_TOP_COUNT({col_name}, 21) AS values_{i}")
+            else:
+                stats_sql.append(f"ARRAY_AGG(DISTINCT {col_name} IGNORE NULLS "
+                                 f"LIMIT 21) AS values_{i}")
+            if col_dtype in ["INTEGER", "FLOAT"]:
+                stats_sql.append(f"AVG({col_name}) AS mean_{i}")
+            if sample_percent is None:
+                stats_sql.append(f"{self._get_fingerprint_sql(col_name)} "
+                                 f"AS fingerprint_{i}")
+        sample_sql = (f"TABLESAMPLE SYSTEM ({sample_percent} PERCENT)" 
+                      if sample_percent is not None else "")
+        return f"""
+            SELECT {", ".join(stats_sql)}
+            FROM `{self.full_table_id}` {sample_sql}
+        """
+    
+    
+    def _get_data_dict_description(self, col_dtype, stats_df, i):
+        """Describes a column from the stats returned by the data dict query
+        
+        Args:
+            col_dtype: string, data type of the column
+            stats_df: pandas.DataFrame, result of the query from 
+                `_get_data_dict_stats_sql`
+            i: int, position of the column in the table schema
+            
+        Returns:
+            string, description of the column for the data dictionary
+        """
+        n_unique_values = stats_df[f"n_{i}"][0]
+        if col_dtype in ["INTEGER", "DATETIME", "FLOAT"]:
+            description = f"{n_unique_values} Unique Values - "
+            description += f"Min: {stats_df[f'min_{i}'][0]}, "
+            description += f"Max: {stats_df[f'max_{i}'][0]}"
+            if col_dtype != "DATETIME":
+                description += f", Mean: {stats_df[f'mean_{i}'][0]}"
+            return description
+        
+        values = stats_df[f"values_{i}"][0]
+        if values is None:
+            values = []
+        # APPROX_TOP_COUNT returns value/count pairs, including NULLs
+        values = [val["value"] if isinstance(val, dict) else val 
+                  for val in values]
+        values = [val for val in values if val is not None]
+        if n_unique_values > 20:
+            description = f"{n_unique_values} unique Values - Examples: " 
+            description += ", ".join(
+                [str(val) for val in values[:5]]
+            )
+        else:
+            description = f"{n_unique_values} unique Values: " 
+            description += ", ".join(
+                [str(val) for val in values]
+            )
+        return description
+    
+    
+    def _get_data_dict_approximate_stats(self, col_dtype, approximate=False,
+                                         sample_percent=None):
+        """Lists the approximate statistics in a data dict description
+        
+        Args:
+            col_dtype: string, data type of the column
+            approximate: bool (default False), see `build_data_dict`
+            sample_percent: float (default None), see `build_data_dict`
+            
+        Returns:
+            string, comma separated names of approximate statistics, empty if
+                all statistics are exact
+        """
+        approximate_stats = []
+        if approximate or sample_percent is not None:
+            approximate_stats.append("unique values")
             if col_dtype in ["INTEGER", "DATETIME", "FLOAT"]:
-                data_sql = f"SELECT MIN({col_name}) AS min_val, "
-                data_sql += f"MAX({col_name}) AS max_val"
-                if col_dtype != "DATETIME":
-                    data_sql += f", AVG({col_name}) AS mean_val"
-                data_sql += f" FROM `{self.full_table_id}`"
-                data_sql += f" WHERE {col_name} IS NOT NULL"
-                data_df = pd.read_gbq(data_sql)
-                
-                description = f"{n_unique_values} Unique Values - "
-                description = f"Min: {data_df.min_val[0]}, "
-                description += f"Max: {data_df.max_val[0]}"
-                if col_dtype != "DATETIME":
-                    description += f", Mean: {data_df.mean_val[0]}, "
-            elif n_unique_values > 20:
-                unique_values_sql = f"""WITH src AS (
-                    SELECT * FROM `{self.full_table_id}`
-                    WHERE {col_name} IS NOT NULL
-                    LIMIT 1000
-                )
-                SELECT ARRAY_AGG(DISTINCT {col_name}) AS unique_values 
-                FROM src
-                """
-                unique_values_df = pd.read_gbq(unique_values_sql)
-                values = unique_values_df.unique_values[0]
-                description = f"{n_unique_values} unique Values - Examples: " 
-                description += ", ".join(
-                    [str(val) for val in values[:5]]
-                )
+                approximate_stats += ["min", "max"]
             else:
-                unique_values_sql = f"""
-                    SELECT ARRAY_AGG(DISTINCT {col_name}) AS unique_values 
-                    FROM `{self.full_table_id}`
-                    WHERE {col_name} IS NOT NULL
-                """
-                unique_values_df = pd.read_gbq(unique_values_sql)
-                values = unique_values_df.unique_values[0]
-                description = f"{n_unique_values} unique Values: " 
-                description += ", ".join(
-                    [str(val) for val in values]
-                )
-            data_dict["description"].append(description)
-        data_dict_df = pd.DataFrame(data_dict)
-        data_dict_df.to_gbq(destination_table=self.full_table_id + "_data_dict", 
-                            project_id=PROJECT, 
-                            if_exists="replace", 
-                            progress_bar=False)
+                approximate_stats.append("examples")
+        if sample_percent is not None and col_dtype in ["INTEGER", "FLOAT"]:
+            approximate_stats.append("mean")
+        return ", ".join(approximate_stats)
     
     
-    def copy_table_to_dataset(self, overwrite_existing=False, verbose=False):
+    def copy_table_to_dataset(self, overwrite_existing=False, verbose=False,
+                              as_view=False):
         """Creates a copy of the source table in the FDMTable dataset
         
         What it says on the tin: creates a copy of the source table in the
         dataset specified when initialising the FDMTable object. Includes options
         to overwrite an existing table with the same name in the specified dataset.
         If a copy of the table already exists in the dataset and `overwrite_existing` 
-        is False, nothing happens.
+        is False, nothing happens. 
+        
+        Tables are copied with a BigQuery copy job, which isn't billed and 
+        takes seconds whatever the table size - sources that can't be copied 
+        that way (e.g. views) are copied with a query. With `as_view` the 
+        "copy" is a view of the source table instead, so creating it is 
+        instant and free. Changes to the table (adding columns etc.) then just
+        redefine the view until `quick_build` (or `materialize`) writes the 
+        table in a single pass over the source table with every change 
+        applied - see `_write_table`. BigQuery doesn't run a view's query when
+        the view is defined, so errors in those changes (e.g. a bad column 
+        expression) only show up when the table is written. `build` always 
+        works on a physical copy.
         
         Args:
             overwrite_existing: bool, True/False overwrites/leaves an existing 
@@ -497,25 +1058,39 @@ class FDMTable:
                 dataset. 
             verbose: True/False prints/suppresses console output when function
                 runs
+            as_view: bool (default False), True/False creates a view of/a 
+                physical copy of the source table - a view should be built 
+                with `quick_build` (or materialized with `materialize`)
                 
         Returns:
             None - changes occurr in GCP
         """
         
-        src_copy_exists = check_table_exists(self.full_table_id)
+        src_copy = get_table_metadata(self.full_table_id)
         
-        if src_copy_exists and not overwrite_existing:
+        if src_copy is not None and not overwrite_existing:
             if verbose:
                 print(f"    using existing copy of {self.table_id} in " 
                       f"{self.dataset_id}")
         else:
-            copy_table_sql = f"""
-                SELECT * 
-                FROM `{self.source_table_full_id}`
-            """
-            run_sql_query(copy_table_sql, destination=self.full_table_id)
+            # views and tables can't replace one another, so an existing copy
+            # of the other kind is deleted first
+            src_copy_is_view = (src_copy is not None and 
+                                src_copy.table_type == "VIEW")
+            if src_copy is not None and src_copy_is_view != as_view:
+                SESSION.delete_table(self.full_table_id)
+            if as_view:
+                run_sql_query(f"""
+                    CREATE OR REPLACE VIEW `{self.full_table_id}` AS
+                    SELECT * 
+                    FROM `{self.source_table_full_id}`
+                """)
+            else:
+                copy_table(self.source_table_full_id, self.full_table_id)
             if verbose:
-                print(f"    {self.table_id} copied to {self.dataset_id}")
+                copy_kind = " (as a view)" if as_view else ""
+                print(f"    {self.table_id} copied to {self.dataset_id}"
+                      f"{copy_kind}")
             
     
     def recombine(self):
@@ -542,13 +1117,13 @@ class FDMTable:
                              "problems table in {self.dataset_id}")
         recombine_sql = f"""
             SELECT * 
-            FROM {self.full_table_id + "_fdm_problems"}
+            FROM `{self.full_table_id + "_fdm_problems"}`
             UNION ALL
             SELECT NULL AS fdm_problem, *
-            FROM {self.full_table_id}
+            FROM `{self.full_table_id}`
         """
-        run_sql_query(recombine_sql, destination=self.full_table_id)
-        CLIENT.delete_table(self.full_table_id + "_fdm_problems")
+        self._write_table(recombine_sql, materialize=True)
+        SESSION.delete_table(self.full_table_id + "_fdm_problems")
         
         
     def _add_person_id_to_table(self, verbose=False):
@@ -565,6 +1140,33 @@ class FDMTable:
         Returns:
             None - changes occurr in GCP
         """
+        person_id_sql, identifier = self._get_person_id_sql(verbose=verbose)
+        if person_id_sql is not None:
+            self._write_table(person_id_sql)
+        if identifier is not None:
+            self._check_person_id_joined(f"`{self.full_table_id}`")
+            if verbose:
+                print("    person_id column added")
+                
+                
+    def _get_person_id_sql(self, verbose=False):
+        """Builds query returning the table with an INTEGER person_id column
+        
+        If the table has a person_id column that isn't an INTEGER it's cast to
+        one, otherwise if there's no person_id column it's joined from 
+        DEMOGRAPHICS using the digest or EDRN column.
+
+        Args:
+            verbose: True/False prints/suppresses console output when function
+                runs
+                
+        Returns:
+            tuple, (person_id_sql, identifier) - person_id_sql is an SQL query
+                returning person_id followed by the rest of the table's 
+                columns, or None if the table already has an INTEGER person_id,
+                and identifier is the column person_id is joined on, or None if
+                the table already has a person_id column
+        """
         
         correct_identifiers = ["person_id", "digest", "EDRN"]
         identifiers_in_table = [col for col in self.get_column_names() 
@@ -583,109 +1185,481 @@ class FDMTable:
                 convert_person_id_sql = f"""
                     SELECT CAST(person_id AS INTEGER) AS person_id, 
                         * EXCEPT(person_id)
-                    FROM `{self.full_table_id}` 
+                    FROM `{self._read_table_id}` 
                 """
-                run_sql_query(convert_person_id_sql, destination=self.full_table_id)
+                return convert_person_id_sql, None
             elif verbose:
                 print(f"    {self.table_id} already contains person_id column")
+            return None, None
+        if "digest" in self.get_column_names():
+            identifier = "digest"
         else:
-            if "digest" in self.get_column_names():
-                identifier = "digest"
-            else:
-                identifier = "EDRN" 
-            add_person_id_sql = f"""
-                SELECT demo.person_id, src.*
-                FROM `{self.full_table_id}` src
-                LEFT JOIN `{DEMOGRAPHICS}` demo
-                ON src.{identifier} = demo.{identifier}
-            """
-            run_sql_query(add_person_id_sql, destination=self.full_table_id)
-            person_id_df = pd.read_gbq(f"SELECT person_id FROM {self.full_table_id}")
-            if person_id_df.person_id.isna().all():
-                raise ValueError(
-                    "none of identifier column entries have corresponding " 
-                    "person_id - join\nresulted in all NULL values"
-                )
-            if verbose:
-                print("    person_id column added")
+            identifier = "EDRN" 
+        add_person_id_sql = f"""
+            SELECT demo.person_id, src.*
+            FROM `{self._read_table_id}` src
+            LEFT JOIN `{DEMOGRAPHICS}` demo
+            ON src.{identifier} = demo.{identifier}
+        """
+        return add_person_id_sql, identifier
+    
+    
+    def _check_person_id_joined(self, table_sql):
+        """Raises an error if joining person_id found no matches
+        
+        Args:
+            table_sql: string, table (quoted full id) or subquery (in brackets)
+                with a person_id column
+                
+        Returns:
+            None
+        """
+        n_person_id_df = SESSION.read_query(f"""
+            SELECT COUNTIF(person_id IS NOT NULL) AS n_person_id
+            FROM {table_sql}
+        """)
+        if n_person_id_df.n_person_id[0] == 0:
+            raise ValueError(
+                "none of identifier column entries have corresponding " 
+                "person_id - join\nresulted in all NULL values"
+            )
             
             
-    def _get_fdm_date_df(self, date_cols, yearfirst, dayfirst):
-        """Reads and parses dates from source table as pandas DataFrame
-
-        Reads data from table containing date information into pandas DataFrame 
-        and parses with the dateutil parser. UUID required in dataframe, as 
-        parsed dates need to be added back to table.
+    def _get_raw_date_sql(self, date_cols):
+        """Builds SQL expression returning the raw date info as a STRING
 
         Args:
             date_cols: string/list, either a string naming a column that contains
                 all the date information (day & month & year) or a list naming 
                 column names or static values containing the day/month/year info
-            yearfirst: bool, if the year appears first in the date info - supersedes
-                dayfirst so yearfirst=True always assumes year info appears first
-                followed by day/month. If False, assumes year appears last.
-            dayfirst: bool, if day appears before month. Superseeded by yearfirst 
-                i.e. yearfirst=True, dayfirst=True means Year/day/month format
                 
         Returns:
-            pandas DataFrame, containing UUID column and parsed_date column with
-                datetimes
+            string, SQL expression - either the date column cast to a STRING or
+                a CONCAT of the day/month/year cols/static values separated by 
+                "-"
         """
-
+        
         schema_dict = self._get_table_schema_dict()
+        
+        def cast_col_sql(col):
+            if col in schema_dict.keys() and schema_dict[col] == "STRING":
+                return col
+            elif col in schema_dict.keys(): 
+                return f"CAST({col} AS STRING)"
+            else:
+                return f'"{col}"'
+            
         if type(date_cols) == list and len(date_cols) == 3:
-            cast_cols_sql = []
-            for col in date_cols:
-                if col in schema_dict.keys() and schema_dict[col] == "STRING":
-                    cast_cols_sql.append(col)
-                elif col in schema_dict.keys(): 
-                    cast_cols_sql.append(f"CAST({col} AS STRING)")
-                else:
-                    cast_cols_sql.append(f'"{col}"')
-            to_concat_sql = ', "-", '.join(cast_cols_sql) 
-            sql = f"""
-                SELECT uuid, CONCAT({to_concat_sql}) AS date
-                FROM `{self.full_table_id}`
-            """
+            to_concat_sql = ', "-", '.join(
+                [cast_col_sql(col) for col in date_cols]
+            ) 
+            return f"CONCAT({to_concat_sql})"
         else:
-            sql = f"""
-                SELECT uuid, {date_cols} AS date
-                FROM `{self.full_table_id}`
+            return cast_col_sql(date_cols)
+    
+    
+    def _get_date_sample(self, date_cols, 
+                         sample_size=DATE_FORMAT_CHECK_SAMPLE_SIZE):
+        """Reads a random sample of distinct raw dates from the table
+        
+        Args:
+            date_cols: string/list, either a string naming a column that contains
+                all the date information (day & month & year) or a list naming 
+                column names or static values containing the day/month/year info
+            sample_size: int, max number of distinct dates in the sample
+                
+        Returns:
+            pandas.Series, raw date strings
+        """
+        sample_sql = f"""
+            SELECT date
+            FROM (
+                SELECT DISTINCT {self._get_raw_date_sql(date_cols)} AS date
+                FROM `{self._read_table_id}`
+            )
+            WHERE date IS NOT NULL
+            ORDER BY RAND()
+            LIMIT {sample_size}
+        """
+        return SESSION.read_query(sample_sql).date
+    
+    
+    def _check_date_format(self, date_cols, date_format=None):
+        """Confirms or recommends a date format using a sample of dates
+        
+        Scores each of YMD/YDM/DMY/MDY against a sample of the distinct dates 
+        (see `detect_date_format`) so that wrong or ambiguous date formats are 
+        caught before any full-table work is done. Columns that are already 
+        DATE/DATETIME aren't checked.
+        
+        Args:
+            date_cols: string/list, either a string naming a column that contains
+                all the date information (day & month & year) or a list naming 
+                column names or static values containing the day/month/year info
+            date_format: string (default None), one of "DMY"/"MDY"/"YMD"/"YDM" -
+                the format to confirm, if None, a format is recommended
+                
+        Returns:
+            string, the confirmed/recommended date format
+            
+        Raises:
+            ValueError, if the dates can't be parsed in any format, if 
+                date_format fits clearly worse than another format, or if 
+                date_format is None and the format is ambiguous
+        """
+        schema_dict = self._get_table_schema_dict()
+        if type(date_cols) == str and schema_dict.get(date_cols) in ["DATE", "DATETIME"]:
+            return date_format or "YMD"
+        date_sample = self._get_date_sample(date_cols)
+        date_format, _ = detect_date_format(date_sample, date_format)
+        return date_format
+    
+    
+    def _get_sql_parsed_date_sql(self, date_cols, date_format, 
+                                 raw_date_col="fdm_raw_date"):
+        """Builds SQL expression that parses dates inside BigQuery
+        
+        If date_cols is a list where the year, month and day are all INTEGER 
+        columns or static numbers, the date is built with DATE(year, month, day).
+        Otherwise the raw date string (see `_get_raw_date_sql`) is parsed with
+        `build_sql_date_parse`. Either way, only dates that would be parsed 
+        identically by the dateutil parser are parsed - everything else is left 
+        NULL to be parsed in python.
+
+        Args:
+            date_cols: string/list, either a string naming a column that contains
+                all the date information (day & month & year) or a list naming 
+                column names or static values containing the day/month/year info
+            date_format: string, format the date appears in one of "DMY"/"MDY"/
+                "YMD"/"YDM"  D being day,  M month and Y year.
+            raw_date_col: string (default "fdm_raw_date"), name of the column 
+                holding the raw date string
+                
+        Returns:
+            string, SQL expression returning a DATETIME or NULL
+        """
+        
+        if type(date_cols) == list and len(date_cols) == 3:
+            schema_dict = self._get_table_schema_dict()
+            
+            def int_col_sql(col):
+                if col in schema_dict.keys() and schema_dict[col] == "INTEGER":
+                    return col
+                elif col not in schema_dict.keys() and str(col).isdigit():
+                    return str(int(col))
+                else:
+                    return None
+                
+            year, month, day = [int_col_sql(date_cols[date_format.index(part)])
+                                for part in "YMD"]
+            if year and month and day:
+                return f"""
+                    IF({year} BETWEEN 1000 AND 9999, 
+                       CAST(SAFE.DATE({year}, {month}, {day}) AS DATETIME), 
+                       NULL)
+                """
+        yearfirst, dayfirst = DATE_FORMAT_SETTINGS[date_format]
+        return build_sql_date_parse(raw_date_col, 
+                                    yearfirst=yearfirst, 
+                                    dayfirst=dayfirst)
+    
+    
+    def _get_parsed_date_src_sql(self, date_specs, src_table_sql=None):
+        """Builds query returning the table with raw and SQL parsed dates added
+        
+        Args:
+            date_specs: list, (date_cols, date_format, date_column_name) tuples,
+                see `_add_parsed_dates_to_table`
+            src_table_sql: string (default None), table (quoted full id) or 
+                subquery (in brackets) to read the table's data from - defaults
+                to the table
+                
+        Returns:
+            string, SQL query selecting all the table columns plus, for the ith
+                date spec, fdm_raw_date_i, the raw date string, and 
+                fdm_sql_parsed_date_i, the date parsed in BigQuery (NULL if it 
+                couldn't be parsed in SQL)
+        """
+        raw_dates_sql = []
+        sql_parsed_dates_sql = []
+        for i, (date_cols, date_format, _) in enumerate(date_specs):
+            raw_date_sql = self._get_raw_date_sql(date_cols)
+            raw_dates_sql.append(f"{raw_date_sql} AS fdm_raw_date_{i}")
+            sql_parsed_date_sql = self._get_sql_parsed_date_sql(
+                date_cols, date_format, raw_date_col=f"fdm_raw_date_{i}"
+            )
+            sql_parsed_dates_sql.append(
+                f"{sql_parsed_date_sql} AS fdm_sql_parsed_date_{i}"
+            )
+        raw_dates_sql = ",\n".join(raw_dates_sql)
+        sql_parsed_dates_sql = ",\n".join(sql_parsed_dates_sql)
+        src_table_sql = src_table_sql or f"`{self._read_table_id}`"
+        return f"""
+            SELECT *, {sql_parsed_dates_sql}
+            FROM (
+                SELECT *, {raw_dates_sql}
+                FROM {src_table_sql}
+            )
+        """
+    
+    
+    def plan_parsed_dates(self, date_specs, date_key_prefix=""):
+        """Validates date specs and plans which of them need parsing
+        
+        The returned plan is passed to `join_parsed_dates` once the dates 
+        BigQuery can't parse have been parsed in python and uploaded (see 
+        `upload_parsed_dates`), so the table's schema is only read once.
+        
+        Args:
+            date_specs: list, (date_cols, date_format, date_column_name) tuples,
+                see `_add_parsed_dates_to_table`
+            date_key_prefix: string (default ""), prefix added to the date_key
+                of each date spec - used to tell apart date specs from 
+                different tables
+                
+        Returns:
+            dict, with keys date_specs, parse_specs - the date specs that aren't
+                single columns already in DATE/DATETIME format, schema_dict - 
+                the table's column: type dict, date_key_prefix and 
+                unparsed_dates_sql - query returning the distinct dates 
+                BigQuery couldn't parse (see `_get_unparsed_dates_sql`), None 
+                if no date specs need parsing
+        """
+        for date_cols, _, _ in date_specs:
+            input_is_len_3_list = type(date_cols) == list and len(date_cols) == 3
+            input_is_string = type(date_cols) == str
+            if not input_is_len_3_list and not input_is_string:
+                raise ValueError("Date cols must be either:\n    1. list naming "
+                                 "cols or static values containing day/month/year "
+                                 "info\n    2. string naming one column containing "
+                                 "date info")
+        schema_dict = self._get_table_schema_dict()
+        parse_specs = [(date_cols, date_format, date_column_name) 
+                       for date_cols, date_format, date_column_name in date_specs
+                       if not (type(date_cols) == str 
+                               and schema_dict[date_cols] in ["DATE", "DATETIME"])]
+        unparsed_dates_sql = None
+        if parse_specs:
+            unparsed_dates_sql = self._get_unparsed_dates_sql(
+                parse_specs, date_key_prefix=date_key_prefix
+            )
+        return {
+            "date_specs": date_specs,
+            "parse_specs": parse_specs,
+            "schema_dict": schema_dict,
+            "date_key_prefix": date_key_prefix,
+            "unparsed_dates_sql": unparsed_dates_sql
+        }
+    
+    
+    def _get_unparsed_dates_sql(self, parse_specs, date_key_prefix=""):
+        """Builds query returning the distinct dates BigQuery couldn't parse
+        
+        Args:
+            parse_specs: list, (date_cols, date_format, date_column_name) tuples,
+                see `_add_parsed_dates_to_table`
+            date_key_prefix: string (default ""), prefix added to the date_key
+                of each date spec - used to tell apart date specs from 
+                different tables
+                
+        Returns:
+            string, SQL query with a date_key column, date_key_prefix plus the 
+                position of the date spec in parse_specs, a date_format column
+                and a date column of raw date strings
+        """
+        unparsed_dates_sql = "\nUNION DISTINCT\n".join(
+            f"""
+                SELECT "{date_key_prefix}{i}" AS date_key, 
+                    "{date_format}" AS date_format, 
+                    fdm_raw_date_{i} AS date
+                FROM src
+                WHERE fdm_sql_parsed_date_{i} IS NULL
+                    AND fdm_raw_date_{i} IS NOT NULL
             """
+            for i, (_, date_format, _) in enumerate(parse_specs)
+        )
+        return f"""
+            WITH src AS (
+                {self._get_parsed_date_src_sql(parse_specs)}
+            )
+            {unparsed_dates_sql}
+        """
+    
+    
+    def _add_parsed_dates_to_table(self, date_specs, batch_size=None, 
+                                   n_workers=None, src_table_sql=None):
+        """Adds several parsed date columns to the table in one rewrite
 
-        dates_df = pd.read_gbq(query=sql, project_id=PROJECT)
+        Takes date information from the specified column(s) for each date spec,
+        parses datetime information and adds the datetimes as new columns. 
+        Dates in single columns that already contain datetimes/dates are simply 
+        copied across. Otherwise dates are parsed inside BigQuery where 
+        possible, and only the distinct raw date values BigQuery couldn't parse 
+        are downloaded (in one query for all date specs), parsed in python, 
+        uploaded as a small raw -> parsed lookup table and joined back to the 
+        table on the raw value. All the new columns are then added in a single 
+        rewrite of the table.
+
+        Args:
+            date_specs: list, (date_cols, date_format, date_column_name) tuples 
+                where date_cols is a string naming a column that contains all 
+                the date information (day & month & year) or a list naming 
+                column names or static values containing the day/month/year 
+                info, date_format is the format the date appears in, one of 
+                "DMY"/"MDY"/"YMD"/"YDM" D being day, M month and Y year, and 
+                date_column_name is the name to give the new DATETIME column
+            batch_size: int (default None), if set, dates that need parsing in
+                python are streamed in batches of at most batch_size rows (see 
+                `upload_parsed_dates`) rather than read all at once
+            n_workers: int (default None), number of processes used to parse 
+                dates with the dateutil parser - defaults to available CPUs
+            src_table_sql: string (default None), see `join_parsed_dates`
+                
+        Returns:
+            list, bools for each date spec - True if parsed date column 
+                successfully added to table, otherwise False
+        """
         
-        def date_is_short(date):
-            if type(date) is str and len(date) <= 8:
-                return True
-            elif not date:
-                return True
-            else:
-                return False
-        if all(dates_df.date.apply(date_is_short)):
-                print("""
-    WARNING: 2 character years are ambiguous e.g. 75 will be parsed as 1975 but 
-    70 will be parsed as 2070. Consider converting year.
-                """)
-        def parse_date(x):
-            if type(x) is datetime.datetime:
-                x = x.date
-            try:
-                return parse(str(x), dayfirst=dayfirst, yearfirst=yearfirst)
-            except:
-                return None
-        dates_df["parsed_date"] = dates_df.date.apply(parse_date)
-        return dates_df[["uuid", "parsed_date"]]
+        date_plan = self.plan_parsed_dates(date_specs)
+        temp_dates_id = f"{PROJECT}.{self.dataset_id}.tmp_dates"
+        parsed_date_keys = set()
+        if date_plan["unparsed_dates_sql"]:
+            parsed_date_keys = upload_parsed_dates(
+                date_plan["unparsed_dates_sql"], 
+                temp_dates_id, 
+                batch_size=batch_size, 
+                n_workers=n_workers
+            )
+                
+        dates_added = self.join_parsed_dates(
+            date_plan, temp_dates_id, parsed_date_keys, 
+            src_table_sql=src_table_sql
+        )
+        if parsed_date_keys:
+            SESSION.delete_table(temp_dates_id)
+        return dates_added
+    
+    
+    def join_parsed_dates(self, date_plan, temp_dates_id, parsed_date_keys,
+                          src_table_sql=None):
+        """Adds parsed date columns to the table from a raw -> parsed lookup
 
+        Adds a column for each date spec in a single rewrite of the table, 
+        using dates parsed in BigQuery where possible and otherwise joining 
+        the dates parsed in python from the lookup table. Existing columns with
+        the same names as the new columns are replaced.
 
-    def _add_parsed_date_to_table(self, date_cols, date_format, date_column_name):
+        Args:
+            date_plan: dict, plan for the date specs to add, as returned by
+                `plan_parsed_dates`
+            temp_dates_id: string, full id of the raw -> parsed date lookup 
+                table (see `upload_parsed_date_lookup`)
+            parsed_date_keys: set, date_keys (see `_get_unparsed_dates_sql`) of 
+                the date specs with dates parsed in the lookup table
+            src_table_sql: string (default None), table (quoted full id) or 
+                subquery (in brackets) to read the table's data from - defaults
+                to the table. If given the table is always rewritten, even if 
+                no date columns are added
+                
+        Returns:
+            list, bools for each date spec - True if parsed date column 
+                successfully added to table, otherwise False
+        """
+        date_specs = date_plan["date_specs"]
+        parse_specs = date_plan["parse_specs"]
+        schema_dict = date_plan["schema_dict"]
+        date_key_prefix = date_plan["date_key_prefix"]
+        residue_parsed = {i for i in range(len(parse_specs))
+                          if f"{date_key_prefix}{i}" in parsed_date_keys}
+        sql_parsed = set()
+        if parse_specs:
+            src_sql = self._get_parsed_date_src_sql(parse_specs, src_table_sql)
+            no_residue_parsed = [i for i in range(len(parse_specs)) 
+                                 if i not in residue_parsed]
+            if no_residue_parsed:
+                n_sql_parsed_sql = "SELECT " + ", ".join(
+                    f"COUNTIF(fdm_sql_parsed_date_{i} IS NOT NULL) AS n_{i}"
+                    for i in no_residue_parsed
+                ) + f" FROM ({src_sql})"
+                n_sql_parsed_df = SESSION.read_query(n_sql_parsed_sql)
+                sql_parsed = {i for i in no_residue_parsed 
+                              if n_sql_parsed_df[f"n_{i}"][0] > 0}
+        else:
+            src_sql = "SELECT * FROM " + (src_table_sql or 
+                                          f"`{self._read_table_id}`")
+        
+        # columns are placed as they were when each date was added in turn: 
+        # copied DATE/DATETIME columns after the existing columns and parsed 
+        # dates in front of them, the most recently added first
+        dates_added = []
+        new_cols_sql = []
+        copied_cols_sql = []
+        joins_sql = []
+        parse_index = 0
+        for date_cols, date_format, date_column_name in date_specs:
+            if (date_cols, date_format, date_column_name) not in parse_specs:
+                copied_cols_sql.append(f"src.{date_cols} AS {date_column_name}")
+                dates_added.append(True)
+                continue
+            i = parse_index
+            parse_index += 1
+            if i in residue_parsed:
+                new_cols_sql.insert(0, 
+                    f"COALESCE(src.fdm_sql_parsed_date_{i}, dates_{i}.parsed_date) "
+                    f"AS {date_column_name}"
+                )
+                joins_sql.append(f"""
+                    LEFT JOIN dates AS dates_{i}
+                    ON dates_{i}.date_format = "{date_format}"
+                        AND src.fdm_raw_date_{i} = dates_{i}.date
+                """)
+            elif i in sql_parsed:
+                new_cols_sql.insert(0, 
+                    f"src.fdm_sql_parsed_date_{i} AS {date_column_name}"
+                )
+            dates_added.append(i in residue_parsed or i in sql_parsed)
+        
+        existing_cols = [date_column_name for _, _, date_column_name in date_specs
+                         if date_column_name in schema_dict.keys()]
+        if not new_cols_sql and not copied_cols_sql and src_table_sql is None:
+            for col in existing_cols:
+                self.drop_column(col)
+            return dates_added
+        
+        except_cols = existing_cols + [
+            f"{col}_{i}" for i in range(len(parse_specs))
+            for col in ["fdm_raw_date", "fdm_sql_parsed_date"]
+        ]
+        except_sql = f" EXCEPT({', '.join(except_cols)})" if except_cols else ""
+        # the lookup can contain the same date more than once when it's been 
+        # uploaded in batches, so only distinct rows are joined
+        dates_sql = f"""
+            WITH dates AS (
+                SELECT DISTINCT date_format, date, parsed_date
+                FROM `{temp_dates_id}`
+            )
+        """ if joins_sql else ""
+        join_dates_sql = f"""
+            {dates_sql}
+            SELECT {"".join(col + ", " for col in new_cols_sql)}src.*{except_sql}
+                {"".join(", " + col for col in copied_cols_sql)}
+            FROM ({src_sql}) AS src
+            {"".join(joins_sql)}
+        """
+        # the lookup table is deleted once the dates are joined, so the table
+        # can't stay a view that reads it
+        self._write_table(join_dates_sql, materialize=bool(joins_sql))
+        
+        return dates_added
+    
+    
+    def _add_parsed_date_to_table(self, date_cols, date_format, date_column_name,
+                                  batch_size=None, n_workers=None):
         """Adds date info to table in datetime format
 
         Takes date information from specified column(s), parses datetime 
         information and adds datetime in new column, named by date_column_name 
-        argument. If date_cols is a single column that already contains
-        datetimes/dates, the function simply creates a new colum and copies
-        the data across, naming it using date_column_name.
+        argument. See `_add_parsed_dates_to_table` for details.
 
         Args:
             date_cols: string/list, either a string naming a column that contains
@@ -694,71 +1668,81 @@ class FDMTable:
             date_format: string, format the date appears in one of "DMY"/"MDY"/
                 "YMD"/"YDM"  D being day,  M month and Y year.
             date_column_name: string, name to give the new parsed DATETIME column
+            batch_size: int (default None), if set, dates that need parsing in
+                python are streamed in batches of at most batch_size rows (see 
+                `upload_parsed_dates`) rather than read all at once
+            n_workers: int (default None), number of processes used to parse 
+                dates with the dateutil parser - defaults to available CPUs
                 
         Returns:
             bool, True if parsed date column successfully added to table, 
                 otherwise False
         """
+        return self._add_parsed_dates_to_table(
+            [(date_cols, date_format, date_column_name)], 
+            batch_size=batch_size, 
+            n_workers=n_workers
+        )[0]
+    
+    
+    def _print_date_format_check(self, date_cols):
+        """Prints the date format recommended for a sample of dates
         
-        if date_column_name in self.get_column_names():
-            self.drop_column(date_column_name)
-        
-        input_is_len_3_list = type(date_cols) == list and len(date_cols) == 3
-        input_is_string = type(date_cols) == str
-        if not input_is_len_3_list and not input_is_string:
-            raise ValueError("Date cols must be either:\n    1. list naming "
-                             "cols or static values containing day/month/year "
-                             "info\n    2. string naming one column containing "
-                             "date info")
-            
-        date_format_settings = {
-            "YMD": [True, False],
-            "YDM": [True, True],
-            "DMY": [False, True],
-            "MDY": [False, False]
-        }
-        
-        schema_dict = self._get_table_schema_dict()
-        if type(date_cols) == str and schema_dict[date_cols] in ["DATE", "DATETIME"]:
-            self.add_column(f"{date_cols} as {date_column_name}")
-            return True
-
-        if "uuid" not in self.get_column_names():
-            add_uuid_sql = f"""
-                SELECT GENERATE_UUID() AS uuid, *
-                FROM `{self.full_table_id}`
-            """
-            run_sql_query(add_uuid_sql, destination=self.full_table_id)
-
-        yearfirst, dayfirst = date_format_settings[date_format]
-        dates_df = self._get_fdm_date_df(date_cols, 
-                                           yearfirst=yearfirst,
-                                           dayfirst=dayfirst)
+        Args:
+            date_cols: string, name of the column containing date information
+                
+        Returns:
+            pandas.Series, the sample of raw dates used for the check -- or --
+                None if the column is already a DATE/DATETIME
+        """
+        if self._get_table_schema_dict()[date_cols] in ["DATE", "DATETIME"]:
+            return None
+        date_sample = self._get_date_sample(date_cols)
+        try:
+            date_format, scores = detect_date_format(date_sample)
+            print(f"""
+    Checked a sample of {len(date_sample)} dates in {date_cols} - they look to be 
+    in {date_format} format. Share of sampled dates fitting each format: 
+    {describe_date_format_scores(scores)}""")
+        except ValueError as e:
+            print(e)
+        return date_sample
+    
+    
+    def _confirm_date_format_w_inputs(self, date_sample, date_format):
+        """Checks a date format against a sample of dates with user input
         
-        if dates_df.parsed_date.isna().all():
-            self.drop_column("uuid")
-            return False
+        If the date format looks wrong for the sampled dates, the user is asked 
+        whether to continue with it anyway or to enter a different format.
         
-        temp_dates_id = f"{PROJECT}.{self.dataset_id}.tmp_dates"
-        dates_df.to_gbq(destination_table=temp_dates_id,
-                        project_id=PROJECT,
-                        table_schema=[{"name":"parsed_date", "type":"DATETIME"}],
-                        if_exists="replace",
-                        progress_bar=False)
-
-        join_dates_sql = f"""
-            SELECT dates.parsed_date AS {date_column_name}, src.*
-            FROM `{self.full_table_id}` AS src
-            LEFT JOIN `{temp_dates_id}` as dates
-            ON src.uuid = dates.uuid
+        Args:
+            date_sample: pandas.Series, sample of raw date strings
+            date_format: string, one of "DMY"/"MDY"/"YMD"/"YDM"
+                
+        Returns:
+            string, date format confirmed by the user
         """
-        run_sql_query(join_dates_sql, destination=self.full_table_id)
-
-        self.drop_column("uuid")
-
-        CLIENT.delete_table(temp_dates_id)
-        
-        return True
+        while True:
+            try:
+                detect_date_format(date_sample, date_format)
+                return date_format
+            except ValueError as e:
+                print(e)
+            response = input(f"""
+    Continue with {date_format} anyway?
+    > Type y or n: """)
+            while response not in ["y", "n"]:
+                response = input("    Your response didn't match y or n.\n"
+                                 "    > Try again: ")
+            if response == "y":
+                return date_format
+            date_format = input("""
+    What format does the date appear in YMD/YDM/DMY/MDY?
+    > Type one: """)
+            while date_format not in ["YMD", "YDM", "DMY", "MDY"]:
+                date_format = input("""
+    Response must be one of YMD/YDM/DMY/MDY."
+    > Try again: """)
     
     
     def _copy_table_to_dataset_w_inputs(self): 
@@ -792,6 +1776,9 @@ class FDMTable:
         
         self.copy_table_to_dataset(overwrite_existing=overwrite_existing,
                                    verbose=True)
+        # each build step runs (and so fails) straight away on a physical 
+        # table, whereas changes to a view aren't run until it's materialized
+        self.materialize()
             
             
     def _add_person_id_to_table_w_inputs(self):
@@ -820,7 +1807,7 @@ class FDMTable:
                         * EXCEPT(person_id)
                     FROM `{self.full_table_id}` 
                 """
-                run_sql_query(convert_person_id_sql, destination=self.full_table_id)
+                self._write_table(convert_person_id_sql)
             return True
         
         col_names_list_string = "".join(
@@ -928,6 +1915,7 @@ class FDMTable:
                 fdm_start_date_cols = input(f"""
     {fdm_start_date_cols} doesn't match any of the columns in {self.table_id}"
     > Try again: """)
+            date_sample = self._print_date_format_check(fdm_start_date_cols)
             fdm_start_date_format = input("""
     What format does the date appear in YMD/YDM/DMY/MDY?
     > Type one: """)
@@ -935,6 +1923,10 @@ class FDMTable:
                 fdm_start_date_format = input("""
     Response must be one of YMD/YDM/DMY/MDY."
     > Try again: """)
+            if date_sample is not None:
+                fdm_start_date_format = self._confirm_date_format_w_inputs(
+                    date_sample, fdm_start_date_format
+                )
         else:
             year = input("""
     We'll build the event start date beginning with identifying the year.  
@@ -1060,13 +2052,18 @@ class FDMTable:
                 fdm_end_date_cols = input(f"""
     {fdm_end_date_cols} doesn't match any of the columns in {self.table_id}"
     > Try again: """)
+            date_sample = self._print_date_format_check(fdm_end_date_cols)
             fdm_end_date_format = input("""
     What format does the date appear in? YMD/YDM/DMY/MDY
     > type one: """)
             while fdm_end_date_format not in ["YMD", "YDM", "DMY", "MDY"]:
-                fdm_end_date_cols = input("""
+                fdm_end_date_format = input("""
     Response must be one of YMD/YDM/DMY/MDY.
     > Try again: """)
+            if date_sample is not None:
+                fdm_end_date_format = self._confirm_date_format_w_inputs(
+                    date_sample, fdm_end_date_format
+                )
         else:
             year = input("""
     Where can the event end year be found?
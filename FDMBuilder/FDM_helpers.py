@@ -1,18 +1,810 @@
 # from google.cloud import bigquery
-from google.cloud import bigquery
-import numpy as np
-import pandas as pd
+from FDMBuilder.date_helpers import (date_is_short, parse_date_lookup, 
+                                     save_date_parse_cache)
+from FDMBuilder.lazy_imports import lazy_import
+import collections
+import hashlib
+import os
+import re
+import threading
+import time
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning)
 warnings.filterwarnings("ignore", category=SyntaxWarning)
 
+bigquery = lazy_import("google.cloud.bigquery")
+gcp_exceptions = lazy_import("google.api_core.exceptions")
+np = lazy_import("numpy")
+pa = lazy_import("pyarrow")
+pd = lazy_import("pandas")
+
 # Set global variables
 PROJECT = "yhcr-prd-phm-bia-core"
-CLIENT = bigquery.Client(project=PROJECT)
+PARSED_DATE_LOOKUP_SCHEMA = [{"name":"date_format", "type":"STRING"},
+                             {"name":"date", "type":"STRING"},
+                             {"name":"parsed_date", "type":"DATETIME"}]
+METADATA_CACHE_TTL = 300
+# max connections kept open to the BigQuery API - shared by every thread
+HTTP_POOL_SIZE = 32
+QUERY_CACHE_MAX_BYTES = 256 * 2 ** 20
+QUERY_CACHE_MAX_DISK_BYTES = 2 * 2 ** 30
+# results of queries using these can change without any table changing
+NON_DETERMINISTIC_SQL = re.compile(
+    r"\b(RAND|GENERATE_UUID|CURRENT_DATE|CURRENT_DATETIME|CURRENT_TIME|"
+    r"CURRENT_TIMESTAMP|SESSION_USER|INFORMATION_SCHEMA|TABLESAMPLE)\b", 
+    re.IGNORECASE
+)
+TWO_CHARACTER_YEAR_WARNING = """
+    WARNING: 2 character years are ambiguous e.g. 75 will be parsed as 1975 but 
+    70 will be parsed as 2070. Consider converting year.
+"""
+
+
+class BigQuerySession:
+    """Routes all of FDMBuilder's BigQuery reads, writes and queries
+    
+    Owns the BigQuery client and a BigQuery Storage read client used for 
+    every call the library makes. Clients are created the first time they're 
+    needed (creating one is slow as credentials have to be resolved). 
+    Credentials are resolved once, and every BigQuery request goes through 
+    one authorized HTTP session with a pool of up to HTTP_POOL_SIZE 
+    connections. Each thread gets a thin BigQuery client handle on top of 
+    that shared session, so the session is safe to use from worker threads
+    while every thread reuses the same connections. The Storage read client 
+    (used to download query results quickly) is thread-safe so is shared - 
+    if google-cloud-bigquery-storage isn't installed results are downloaded 
+    via the REST API instead.
+    
+    A different backend (e.g. a local stand-in for testing) can be swapped in
+    with `set_client`, which all threads then share.
+    
+    Results of read-only queries made with `read_query` can also be cached,
+    see `enable_result_cache`.
+    
+    Args:
+        project: string, GCP project the clients are created for
+        
+    Attributes:
+        project: GCP project the clients are created for
+    """
+    def __init__(self, project):
+        self.project = project
+        self._credentials = None
+        self._http = None
+        self._injected_client = None
+        self._storage_client = None
+        self._storage_client_checked = False
+        self._thread_clients = threading.local()
+        self._lock = threading.Lock()
+        self._result_cache = None
+        
+        
+    @property
+    def client(self):
+        """bigquery.Client for the current thread"""
+        if self._injected_client is not None:
+            return self._injected_client
+        client = getattr(self._thread_clients, "client", None)
+        if client is None:
+            credentials = self._get_credentials()
+            http = self._get_http()
+            # created under the lock as the lazily imported bigquery module 
+            # can't safely be loaded by several threads at once
+            with self._lock:
+                client = bigquery.Client(project=self.project, 
+                                         credentials=credentials, _http=http)
+            self._thread_clients.client = client
+        return client
+    
+    
+    @property
+    def storage_client(self):
+        """Shared BigQuery Storage read client, or None if not available"""
+        if self._injected_client is not None or self._storage_client_checked:
+            return self._storage_client
+        # resolved before taking the lock, which _get_credentials also takes
+        credentials = self._get_credentials()
+        with self._lock:
+            if not self._storage_client_checked:
+                try:
+                    from google.cloud import bigquery_storage
+                    self._storage_client = bigquery_storage.BigQueryReadClient(
+                        credentials=credentials
+                    )
+                except ImportError:
+                    self._storage_client = None
+                self._storage_client_checked = True
+        return self._storage_client
+    
+    
+    def _get_credentials(self):
+        """Resolves the default GCP credentials, once per session
+        
+        Returns:
+            google.auth.credentials.Credentials
+        """
+        if self._credentials is None:
+            with self._lock:
+                if self._credentials is None:
+                    import google.auth
+                    self._credentials, _ = google.auth.default(
+                        scopes=bigquery.Client.SCOPE
+                    )
+        return self._credentials
+    
+    
+    def _get_http(self):
+        """Creates the HTTP session shared by every thread, once per session
+        
+        Returns:
+            google.auth.transport.requests.AuthorizedSession, with a 
+                connection pool of HTTP_POOL_SIZE connections
+        """
+        if self._http is None:
+            credentials = self._get_credentials()
+            with self._lock:
+                if self._http is None:
+                    from google.auth.transport.requests import AuthorizedSession
+                    from requests.adapters import HTTPAdapter
+                    http = AuthorizedSession(credentials)
+                    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE,
+                                          pool_maxsize=HTTP_POOL_SIZE)
+                    http.mount("https://", adapter)
+                    self._http = http
+        return self._http
+    
+    
+    def set_client(self, client, storage_client=None):
+        """Replaces the backend used by the session
+        
+        Args:
+            client: bigquery.Client (or object with the same interface e.g. a 
+                local stand-in for testing), used by every thread - or None to
+                go back to creating BigQuery clients as needed
+            storage_client: BigQuery Storage read client (default None), used
+                to download results - if None results are downloaded via 
+                client
+                
+        Returns:
+            None
+        """
+        with self._lock:
+            self._injected_client = client
+            self._storage_client = storage_client
+            self._storage_client_checked = client is not None
+            self._thread_clients = threading.local()
+        invalidate_table_metadata()
+        
+        
+    def enable_result_cache(self, max_bytes=QUERY_CACHE_MAX_BYTES, 
+                            cache_dir=None, 
+                            max_disk_bytes=QUERY_CACHE_MAX_DISK_BYTES):
+        """Caches the results of read-only queries made with `read_query`
+        
+        Off by default. Once enabled, repeated queries (e.g. `FDMTable.head`,
+        the stats queries in `FDMTable.build_data_dict`) are answered from the
+        cache for as long as none of the tables they read change. See 
+        `QueryResultCache` and `get_query_cache_key` for details of what's 
+        cached.
+        
+        Args:
+            max_bytes: int (default QUERY_CACHE_MAX_BYTES), max size of the 
+                results held in memory
+            cache_dir: string (default None), directory results are also 
+                saved to so they're kept between python sessions - if None 
+                results are only held in memory
+            max_disk_bytes: int (default QUERY_CACHE_MAX_DISK_BYTES), max size
+                of the results saved to cache_dir
+                
+        Returns:
+            None
+        """
+        self._result_cache = QueryResultCache(max_bytes, cache_dir, 
+                                              max_disk_bytes)
+        
+        
+    def disable_result_cache(self):
+        """Stops caching query results and drops those held in memory
+        
+        Any results saved to disk are kept so can be used if the cache is 
+        enabled again with the same cache_dir.
+        
+        Returns:
+            None
+        """
+        self._result_cache = None
+        
+        
+    def _download_kwargs(self):
+        storage_client = self.storage_client
+        if storage_client is None:
+            return {}
+        return {"bqstorage_client": storage_client}
+    
+    
+    def query(self, sql, job_config=None):
+        """Starts a query job
+        
+        Args:
+            sql: string, SQL query
+            job_config: bigquery.QueryJobConfig (default None)
+            
+        Returns:
+            bigquery.QueryJob
+        """
+        return self.client.query(sql, job_config=job_config)
+    
+    
+    def read_query(self, sql, use_cache=True):
+        """Runs a query and downloads the results
+        
+        If the result cache is enabled (see `enable_result_cache`) and the 
+        query can be cached, results are read from/saved to the cache.
+        
+        Args:
+            sql: string, SQL query
+            use_cache: bool (default True), if False the result cache is 
+                bypassed, e.g. for queries that write to tables
+            
+        Returns:
+            pandas.DataFrame, query results
+        """
+        result_cache = self._result_cache
+        cache_key = None
+        if result_cache is not None and use_cache:
+            cache_key = get_query_cache_key(sql)
+        if cache_key is None:
+            return self.query(sql).to_dataframe(**self._download_kwargs())
+        results = result_cache.get(cache_key)
+        if results is None:
+            results = self.query(sql).to_arrow(**self._download_kwargs())
+            result_cache.put(cache_key, results)
+        return _arrow_to_dataframe(results)
+    
+    
+    def read_query_batches(self, sql, batch_size):
+        """Runs a query and downloads the results in batches
+        
+        Results are paged through the REST API so that no batch is bigger than
+        batch_size rows.
+        
+        Args:
+            sql: string, SQL query
+            batch_size: int, max rows per batch
+            
+        Returns:
+            generator, pandas.DataFrames of up to batch_size rows
+        """
+        rows = self.query(sql).result(page_size=batch_size)
+        for batch in rows.to_arrow_iterable():
+            yield batch.to_pandas()
+            
+            
+    def read_table(self, table):
+        """Downloads all the rows of a table
+        
+        Args:
+            table: string/bigquery.Table, full id of the table i.e. 
+                "project_id.dataset_id.table_id", or the table itself
+                
+        Returns:
+            pandas.DataFrame, table data
+        """
+        return self.client.list_rows(table).to_dataframe(
+            **self._download_kwargs()
+        )
+    
+    
+    def write_dataframe(self, df, full_table_id, schema, append=False, 
+                        description=None):
+        """Uploads a DataFrame to a table with a load job
+        
+        Args:
+            df: pandas.DataFrame, data to upload
+            full_table_id: string, full id of the table i.e. 
+                "project_id.dataset_id.table_id"
+            schema: list, {"name":..., "type":...} dicts for each column
+            append: bool (default False), if True rows are appended to any 
+                existing table, otherwise any existing table is replaced
+            description: string (default None), table description
+            
+        Returns:
+            None
+        """
+        job_config = bigquery.LoadJobConfig(
+            schema=[bigquery.SchemaField(field["name"], field["type"]) 
+                    for field in schema],
+            write_disposition="WRITE_APPEND" if append else "WRITE_TRUNCATE"
+        )
+        self.client.load_table_from_dataframe(df, full_table_id, 
+                                              job_config=job_config).result()
+        # a load job only sets the description when it creates the table, so
+        # it's set separately to replace any existing table's description
+        if description is not None:
+            table = self.client.get_table(full_table_id)
+            table.description = description
+            self.client.update_table(table, ["description"])
+        invalidate_table_metadata(full_table_id)
+        
+        
+    def copy_table(self, source_table_id, destination_table_id):
+        """Copies a table with a copy job, replacing any existing table
+        
+        Copy jobs aren't billed and take about the same time whatever the 
+        table size.
+        
+        Args:
+            source_table_id: string, full id of the table to copy i.e. 
+                "project_id.dataset_id.table_id"
+            destination_table_id: string, full id of the copy
+            
+        Returns:
+            None
+        """
+        job_config = bigquery.CopyJobConfig(write_disposition="WRITE_TRUNCATE")
+        self.client.copy_table(source_table_id, destination_table_id, 
+                               job_config=job_config).result()
+        invalidate_table_metadata(destination_table_id)
+        
+        
+    def delete_table(self, full_table_id, not_found_ok=False):
+        """Deletes a table
+        
+        Args:
+            full_table_id: string, full id of the table i.e. 
+                "project_id.dataset_id.table_id"
+            not_found_ok: bool (default False), if False raises NotFound if
+                the table doesn't exist
+                
+        Returns:
+            None
+        """
+        self.client.delete_table(full_table_id, not_found_ok=not_found_ok)
+        invalidate_table_metadata(full_table_id)
+        
+        
+    def __getattr__(self, name):
+        # anything else (get_table, list_tables...) goes straight to the client
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.client, name)
+    
+    
+SESSION = BigQuerySession(PROJECT)
+
+
+def _arrow_to_dataframe(table):
+    """Converts Arrow query results to a DataFrame
+    
+    Integer and boolean columns keep their NULLs using pandas' nullable 
+    dtypes, as they are when results are downloaded straight to a DataFrame.
+    
+    Args:
+        table: pyarrow.Table, query results
+        
+    Returns:
+        pandas.DataFrame, query results
+    """
+    nullable_dtypes = {pa.int64(): pd.Int64Dtype(), 
+                       pa.bool_(): pd.BooleanDtype()}
+    return table.to_pandas(types_mapper=nullable_dtypes.get)
+
+
+def set_client(client, storage_client=None):
+    """Sets the backend used for every BigQuery call FDMBuilder makes
+    
+    See `BigQuerySession.set_client`.
+    
+    Args:
+        client: bigquery.Client (or object with the same interface e.g. a 
+            local stand-in for testing)
+        storage_client: BigQuery Storage read client (default None)
+            
+    Returns:
+        None
+    """
+    SESSION.set_client(client, storage_client)
+    
+    
+def enable_query_cache(max_bytes=QUERY_CACHE_MAX_BYTES, cache_dir=None, 
+                       max_disk_bytes=QUERY_CACHE_MAX_DISK_BYTES):
+    """Caches the results of read-only queries FDMBuilder makes
+    
+    See `BigQuerySession.enable_result_cache`.
+    
+    Args:
+        max_bytes: int (default QUERY_CACHE_MAX_BYTES), max size of the 
+            results held in memory
+        cache_dir: string (default None), directory results are also saved to
+        max_disk_bytes: int (default QUERY_CACHE_MAX_DISK_BYTES), max size of
+            the results saved to cache_dir
+            
+    Returns:
+        None
+        
+    Example:
+    ```python
+    enable_query_cache(cache_dir="~/.fdm_query_cache")
+    table.head()  # runs the query
+    table.head()  # read from the cache
+    ```
+    """
+    SESSION.enable_result_cache(max_bytes, cache_dir, max_disk_bytes)
+    
+    
+def disable_query_cache():
+    """Stops caching query results, see `enable_query_cache`
+    
+    Returns:
+        None
+    """
+    SESSION.disable_result_cache()
+    
+    
+class MetadataCache:
+    """Per-session cache of BigQuery table/dataset metadata
+    
+    Holds the `bigquery.Table` (or None if it doesn't exist) for each table and
+    whether each dataset exists, so repeated existence/schema checks don't each
+    need an API round trip. Entries are invalidated whenever this library 
+    changes a table (see `run_sql_query`, `clear_dataset`, 
+    `invalidate_table_metadata`) and expire after ttl seconds as a guard 
+    against changes made outside the library. Safe to share between threads.
+    
+    Args:
+        ttl: int/float (default METADATA_CACHE_TTL), seconds entries are kept
+        
+    Attributes:
+        ttl: seconds entries are kept
+    """
+    def __init__(self, ttl=METADATA_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        
+        
+    def get(self, key, fetch):
+        """Returns the cached value for key, fetching it if missing/expired
+        
+        Args:
+            key: string, cache key
+            fetch: function, called with no arguments to get the value
+            
+        Returns:
+            the cached/fetched value
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+        value = fetch()
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+        return value
+    
+    
+    def set(self, key, value):
+        """Stores value for key
+        
+        Args:
+            key: string, cache key
+            value: value to store
+            
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            
+            
+    def invalidate(self, key=None):
+        """Removes the entry for key, or every entry if key is None
+        
+        Args:
+            key: string (default None), cache key
+            
+        Returns:
+            None
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+_metadata_cache = MetadataCache()
+
+
+class QueryResultCache:
+    """Size bounded cache of query results held as Arrow tables
+    
+    Results are held in memory, least recently used results being evicted 
+    once they total more than max_bytes. If a cache_dir is given results are 
+    also saved there as (uncompressed, memory mapped) Arrow files so they can
+    be reused by later python sessions, least recently used files being 
+    deleted once they total more than max_disk_bytes. Results are stored as 
+    Arrow so no re-serialisation is needed to return them. Keys should 
+    change whenever a result could (see `get_query_cache_key`), so entries 
+    are never invalidated, just evicted. Safe to share between threads.
+    
+    Args:
+        max_bytes: int (default QUERY_CACHE_MAX_BYTES), max size of the 
+            results held in memory
+        cache_dir: string (default None), directory results are also saved to
+        max_disk_bytes: int (default QUERY_CACHE_MAX_DISK_BYTES), max size of
+            the results saved to cache_dir
+            
+    Attributes:
+        max_bytes: max size of the results held in memory
+        cache_dir: directory results are also saved to, or None
+        max_disk_bytes: max size of the results saved to cache_dir
+    """
+    def __init__(self, max_bytes=QUERY_CACHE_MAX_BYTES, cache_dir=None,
+                 max_disk_bytes=QUERY_CACHE_MAX_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = collections.OrderedDict()
+        self._n_bytes = 0
+        self._lock = threading.Lock()
+        if cache_dir is not None:
+            self.cache_dir = os.path.expanduser(cache_dir)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            
+            
+    def _get_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.arrow")
+    
+    
+    def get(self, key):
+        """Returns the cached results for key
+        
+        Args:
+            key: string, cache key
+            
+        Returns:
+            pyarrow.Table, the cached results -- or -- None if not cached
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        if self.cache_dir is None:
+            return None
+        from pyarrow import feather
+        path = self._get_path(key)
+        try:
+            table = feather.read_table(path, memory_map=True)
+            os.utime(path)
+        except (OSError, pa.ArrowInvalid):
+            return None
+        self._put_in_memory(key, table)
+        return table
+    
+    
+    def put(self, key, table):
+        """Stores the results for key
+        
+        Args:
+            key: string, cache key
+            table: pyarrow.Table, query results
+            
+        Returns:
+            None
+        """
+        self._put_in_memory(key, table)
+        if self.cache_dir is None:
+            return
+        from pyarrow import feather
+        # write to a temporary file first so other threads/processes never 
+        # read a partly written file
+        path = self._get_path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        feather.write_feather(table, temp_path, compression="uncompressed")
+        os.replace(temp_path, path)
+        self._evict_from_disk()
+        
+        
+    def _put_in_memory(self, key, table):
+        if table.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._n_bytes -= self._entries.pop(key).nbytes
+            self._entries[key] = table
+            self._n_bytes += table.nbytes
+            while self._n_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._n_bytes -= evicted.nbytes
+                
+                
+    def _evict_from_disk(self):
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".arrow"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        n_bytes = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if n_bytes <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            n_bytes -= size
+            
+            
+    def clear(self):
+        """Removes every result held in memory and saved to disk
+        
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries.clear()
+            self._n_bytes = 0
+        if self.cache_dir is not None:
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(".arrow"):
+                    os.remove(entry.path)
+
+
+def _normalise_table_id(full_table_id):
+    """Adds the default project to table ids given as dataset_id.table_id
+    
+    Args:
+        full_table_id: string, table id with or without project
+        
+    Returns:
+        string, table id as "project_id.dataset_id.table_id"
+    """
+    full_table_id = str(full_table_id).strip("`").replace(":", ".")
+    if full_table_id.count(".") == 1:
+        return f"{PROJECT}.{full_table_id}"
+    return full_table_id
 
 
+def get_table_metadata(full_table_id, refresh=False):
+    """Gets a table's metadata, using the session metadata cache
+    
+    Args:
+        full_table_id: string, full id of a table i.e. 
+            "project_id.dataset_id.table_id"
+        refresh: bool (default False), if True the metadata is always fetched
+            from BigQuery (and the cached copy updated) - for when it has to 
+            reflect changes made outside this library
+            
+    Returns:
+        bigquery.Table, for the table -- or -- None if the table doesn't exist
+    """
+    def fetch_table():
+        try:
+            return SESSION.get_table(full_table_id)
+        except gcp_exceptions.NotFound:
+            return None
+    table_key = "table:" + _normalise_table_id(full_table_id)
+    if refresh:
+        table = fetch_table()
+        _metadata_cache.set(table_key, table)
+        return table
+    return _metadata_cache.get(table_key, fetch_table)
+
+
+def invalidate_table_metadata(full_table_id=None):
+    """Removes a table's metadata from the session metadata cache
+    
+    Should be called after changing a table outside `run_sql_query` e.g. 
+    deleting it. Clears the whole cache if no table is given.
+    
+    Args:
+        full_table_id: string (default None), full id of a table i.e. 
+            "project_id.dataset_id.table_id"
+            
+    Returns:
+        None
+    """
+    if full_table_id is None:
+        _metadata_cache.invalidate()
+    else:
+        _metadata_cache.invalidate("table:" + _normalise_table_id(full_table_id))
+    
+    
+def invalidate_dataset_metadata(dataset_id):
+    """Removes a dataset from the session metadata cache
+    
+    Args:
+        dataset_id: string, id of the dataset
+        
+    Returns:
+        None
+    """
+    _metadata_cache.invalidate("dataset:" + dataset_id)
+    
+    
+def _normalise_sql(sql):
+    """Collapses whitespace (outside of strings/quoted names) in SQL
+    
+    Args:
+        sql: string, SQL query
+        
+    Returns:
+        string, the query with each run of whitespace replaced by one space
+    """
+    quoted_or_whitespace = r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`)|\s+"""
+    return re.sub(quoted_or_whitespace, 
+                  lambda match: match.group(1) or " ", sql).strip()
+
+
+def _get_referenced_tables(sql):
+    """Finds the ids of the tables a query reads
+    
+    Tables are found as dataset_id.table_id/project_id.dataset_id.table_id 
+    ids, either `quoted` anywhere in the query or unquoted after FROM/JOIN. 
+    Quoted ids without a "." (e.g. quoted column names) are ignored.
+    
+    Args:
+        sql: string, SQL query
+        
+    Returns:
+        set, full ids (i.e. "project_id.dataset_id.table_id") of the tables
+    """
+    quoted_ids = re.findall(r"`([^`]+)`", sql)
+    unquoted_ids = re.findall(r"\b(?:FROM|JOIN)\s+([\w.\-]+)", sql, 
+                              re.IGNORECASE)
+    return {_normalise_table_id(table_id) 
+            for table_id in quoted_ids + unquoted_ids if "." in table_id}
+
+
+def get_query_cache_key(sql):
+    """Builds the result cache key for a read-only query
+    
+    The key is a hash of the query (with whitespace normalised) and the last 
+    modified time of every table it reads, so changing any of the tables 
+    changes the key. Tables' modified times are always fetched fresh from 
+    BigQuery (bypassing the session metadata cache), so tables changed 
+    outside this library are never read from the cache.
+    
+    Args:
+        sql: string, SQL query
+        
+    Returns:
+        string, the cache key -- or -- None if the query's results can't be 
+            cached i.e. it doesn't read any tables, a table it reads doesn't 
+            exist or is a view, or it uses INFORMATION_SCHEMA/non-deterministic functions 
+            like RAND()/TABLESAMPLE
+    """
+    normalised_sql = _normalise_sql(sql)
+    if NON_DETERMINISTIC_SQL.search(normalised_sql):
+        return None
+    table_ids = _get_referenced_tables(normalised_sql)
+    if not table_ids:
+        return None
+    key_parts = [normalised_sql]
+    for table_id in sorted(table_ids):
+        try:
+            table = get_table_metadata(table_id, refresh=True)
+        except ValueError:
+            # not a valid table id after all
+            return None
+        # a view's modified time doesn't change when the tables it reads do
+        if table is None or table.table_type != "TABLE" or table.modified is None:
+            return None
+        key_parts.append(f"{table_id}@{table.modified.isoformat()}")
+    return hashlib.sha256("\n".join(key_parts).encode()).hexdigest()
+    
+    
 def rename_columns_in_bigquery(table_id, names_map, verbose=True):
     """Renames columns of a table in bigquery
+    
+    All the columns are renamed with a single ALTER TABLE ... RENAME COLUMN 
+    statement, which only changes the table's metadata so takes the same
+    (short) time however big the table is. Where that isn't possible (columns
+    swapping names/renamed to the old name of another column, or BigQuery 
+    rejecting the statement e.g. for tables that don't support DDL renames) 
+    the table is instead rewritten once with the columns renamed. Either way
+    the columns stay in the same order.
 
     Args:
         table_id: string, full id (project_id.dataset_id.table_id) of the table 
@@ -36,37 +828,217 @@ def rename_columns_in_bigquery(table_id, names_map, verbose=True):
     ```
     """
     
-    alias_list = []
     if verbose:
         print("\tRenaming Columns:")
-    for old_name, new_name in names_map.items():
-        alias_list.append(f"{old_name} AS {new_name}")
-        if verbose:
+        for old_name, new_name in names_map.items():
             print(f"\t{old_name} -> {new_name}")
-    alias_list.append(f"{list(names_map.keys())[0]} AS DUMMY_COL")
-    alias_string = ", ".join(alias_list)
-    old_names_string = ", ".join(names_map.keys())
-    n_table_cols = len(get_table_schema_dict(table_id))
+    column_names = list(get_table_schema_dict(table_id).keys())
+    # compiling the rename checks the columns exist and the new names are free
+    rewrite_sql = build_column_operations_sql(f"`{table_id}`", column_names, 
+                                              [("rename", names_map)])
+    old_names = {old_name.lower() for old_name in names_map.keys()}
+    renamed = False
+    if not any(new_name.lower() in old_names for new_name in names_map.values()):
+        rename_sql = f"ALTER TABLE `{table_id}`\n" + ",\n".join(
+            f"RENAME COLUMN {old_name} TO {new_name}" 
+            for old_name, new_name in names_map.items()
+        )
+        try:
+            run_sql_query(rename_sql)
+            renamed = True
+        except gcp_exceptions.BadRequest:
+            pass
+    if not renamed:
+        run_sql_query(rewrite_sql, destination=table_id)
+    if verbose:
+        print("\tRenaming Complete\n")
     
-    if len(names_map) == n_table_cols:
-        sql = f"""
-            SELECT {alias_string}
-            FROM `{table_id}`
-        """
-    else:
-        sql = f"""
-            SELECT {alias_string}, * EXCEPT({old_names_string})
-            FROM `{table_id}`
-        """
+    
+def _split_select_list(select_sql):
+    """Splits an SQL select list on its top level commas
+    
+    Args:
+        select_sql: string, comma separated SQL expressions e.g. 
+            "a * 2 AS b, CONCAT(c, ", ", d) AS e"
+            
+    Returns:
+        list, strings of each expression
+    """
+    items = []
+    depth = 0
+    start = 0
+    quote = None
+    for i, char in enumerate(select_sql):
+        if quote:
+            if char == quote and select_sql[i - 1] != "\\":
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif char == "," and depth == 0:
+            items.append(select_sql[start:i].strip())
+            start = i + 1
+    items.append(select_sql[start:].strip())
+    return [item for item in items if item]
 
-    run_sql_query(sql=sql, destination=table_id)
-    rop_column_sql = f"""
-        ALTER TABLE `{table_id}`
-        DROP COLUMN DUMMY_COL
+
+def _get_referenced_names(expression_sql):
+    """Lists the (lower case) identifiers used in an SQL expression
+    
+    Args:
+        expression_sql: string, SQL expression
+        
+    Returns:
+        set, lower case identifiers (`quoted` identifiers without their 
+            backticks) outside of any string literals
     """
-    run_sql_query(drop_column_sql)
-    if verbose:
-        print("\tRenaming Complete\n")
+    string_literal = r"""'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*\""""
+    without_strings = re.sub(string_literal, "", expression_sql)
+    quoted_names = re.findall(r"`([^`]+)`", without_strings)
+    without_quoted = re.sub(r"`[^`]+`", "", without_strings)
+    return {name.lower() for name in quoted_names + 
+            re.findall(r"\b[A-Za-z_]\w*\b", without_quoted)}
+
+
+def _column_key(name):
+    """Lower case column name without any backticks, for comparing names"""
+    return name.strip("`").lower()
+
+
+def build_column_operations_sql(table_sql, column_names, operations):
+    """Compiles a series of column changes into a single SELECT
+    
+    Columns end up in the same order and with the same contents as they would
+    if each operation was run on its own (see `FDMTable.add_column`, 
+    `FDMTable.drop_column`, `FDMTable.rename_columns`) - new columns are added
+    at the end and renamed columns keep their place - but the table only 
+    needs to be read and written once. Renames and drops just change the 
+    select list and new columns are computed alongside the existing ones - 
+    only a new column that uses a column added/renamed/dropped earlier in the
+    series needs the previous changes applied in a subquery first.
+    
+    Args:
+        table_sql: string, table (quoted full id) or subquery (in brackets) 
+            the operations are applied to
+        column_names: list, names of the columns of table_sql
+        operations: list, ("add", column_sql), ("drop", column) or 
+            ("rename", names_map) tuples, applied in order - column_sql is an
+            SQL select list of new columns each named with AS, names_map is a
+            dict of current: new column names
+            
+    Returns:
+        string, SQL query returning the changed table
+        
+    Example:
+    ```python
+    build_column_operations_sql(
+        "`project_id.dataset_id.table_id`", ["a", "b", "c"],
+        [("add", "a * 2 AS a_x_2"), ("drop", "b"), ("rename", {"c": "d"})]
+    )
+    # SELECT a, c AS d, a * 2 AS a_x_2 FROM `project_id.dataset_id.table_id`
+    ```
+    """
+    # (name, expression) for each column, expressions being in terms of the 
+    # columns of from_sql
+    columns = [(name, name) for name in column_names]
+    from_sql = table_sql
+    # (lower case) names that no longer mean the same as they do in from_sql
+    changed_names = set()
+    
+    def get_select_sql():
+        return ",\n".join(name if expression == name 
+                          else f"{expression} AS {name}"
+                          for name, expression in columns)
+    
+    def check_column_exists(name):
+        if _column_key(name) not in [_column_key(column) 
+                                     for column, _ in columns]:
+            raise ValueError(f"Column {name} doesn't exist in the table")
+        
+    def check_column_doesnt_exist(name):
+        if _column_key(name) in [_column_key(column) for column, _ in columns]:
+            raise ValueError(f"Column {name} already exists in the table")
+        
+    for operation, arg in operations:
+        if operation == "add":
+            for column_sql in _split_select_list(arg):
+                match = re.fullmatch(r"(.+)\s+AS\s+(\w+|`[^`]+`)", column_sql, 
+                                     re.DOTALL | re.IGNORECASE)
+                if match is None:
+                    raise ValueError(f"New column {column_sql} must be named "
+                                     "with AS e.g. a * 2 AS a_x_2")
+                expression, name = match.group(1).strip(), match.group(2)
+                check_column_doesnt_exist(name)
+                if _get_referenced_names(expression) & changed_names:
+                    from_sql = f"(\nSELECT {get_select_sql()}\nFROM {from_sql}\n)"
+                    columns = [(name, name) for name, _ in columns]
+                    changed_names = set()
+                columns.append((name, expression))
+                changed_names.add(_column_key(name))
+        elif operation == "drop":
+            check_column_exists(arg)
+            columns = [(name, expression) for name, expression in columns 
+                       if _column_key(name) != _column_key(arg)]
+            changed_names.add(_column_key(arg))
+        elif operation == "rename":
+            for old_name in arg.keys():
+                check_column_exists(old_name)
+            renamed = {_column_key(old_name): new_name 
+                       for old_name, new_name in arg.items()}
+            kept_names = [_column_key(name) for name, _ in columns 
+                          if _column_key(name) not in renamed]
+            new_names = [_column_key(new_name) for new_name in arg.values()]
+            for new_name in arg.values():
+                if _column_key(new_name) in kept_names:
+                    raise ValueError(f"Column {new_name} already exists in "
+                                     "the table")
+                if new_names.count(_column_key(new_name)) > 1:
+                    raise ValueError(f"More than one column would be renamed "
+                                     f"to {new_name}")
+            columns = [(renamed.get(_column_key(name), name), expression) 
+                       for name, expression in columns]
+            changed_names |= set(renamed) | set(new_names)
+        else:
+            raise ValueError(f"Unknown column operation {operation}")
+    if not columns:
+        raise ValueError("Column operations would drop every column")
+    return f"""
+        SELECT {get_select_sql()}
+        FROM {from_sql}
+    """
+
+
+def copy_table(source_table_id, destination_table_id):
+    """Copies a table, replacing any existing table at the destination
+    
+    Tables are copied with a copy job (see `BigQuerySession.copy_table`). 
+    Views and other sources copy jobs can't read, or copies BigQuery rejects
+    (e.g. because the existing destination is partitioned differently), are 
+    copied with a `SELECT *` query instead.
+    
+    Args:
+        source_table_id: string, full id of the table to copy i.e. 
+            "project_id.dataset_id.table_id"
+        destination_table_id: string, full id of the copy
+        
+    Returns:
+        None - changes occurr in GCP
+    """
+    source_table = get_table_metadata(source_table_id)
+    if source_table is not None and source_table.table_type == "TABLE":
+        try:
+            SESSION.copy_table(source_table_id, destination_table_id)
+            return
+        except gcp_exceptions.BadRequest:
+            pass
+    copy_table_sql = f"""
+        SELECT * 
+        FROM `{source_table_id}`
+    """
+    run_sql_query(copy_table_sql, destination=destination_table_id)
     
     
 def clear_dataset(dataset_id, containing=None):
@@ -82,12 +1054,12 @@ def clear_dataset(dataset_id, containing=None):
     Returns:
         None - changes occurr in GCP
     """
-    for table in CLIENT.list_tables(dataset_id):
+    for table in SESSION.list_tables(dataset_id):
         print(table.table_id)
         if containing and containing not in table.table_id:
             continue
         full_table_id = f"{dataset_id}.{table.table_id}"
-        CLIENT.delete_table(full_table_id, not_found_ok=True)
+        SESSION.delete_table(full_table_id, not_found_ok=True)
         
         
 def run_sql_query(sql, destination=None):
@@ -134,14 +1106,46 @@ def run_sql_query(sql, destination=None):
     else:
         job_config=None
     
-    query_job = CLIENT.query(sql, job_config=job_config)  # Make an API request.
+    query_job = SESSION.query(sql, job_config=job_config)  # Make an API request.
     query_job.result()  # Wait for the job to complete.
     
     if destination:
-        result_table = CLIENT.get_table(destination)
+        result_table = SESSION.get_table(destination)
+        _metadata_cache.set("table:" + _normalise_table_id(destination), 
+                            result_table)
         return result_table
-    else:
-        return query_job
+    
+    # DDL/DML statements (e.g. ALTER TABLE) change tables without a destination
+    if query_job.statement_type not in (None, "SELECT"):
+        target_table = query_job.ddl_target_table
+        if target_table is not None:
+            invalidate_table_metadata(f"{target_table.project}."
+                                      f"{target_table.dataset_id}."
+                                      f"{target_table.table_id}")
+        else:
+            invalidate_table_metadata()
+    return query_job
+
+        
+def dry_run_sql_query(sql):
+    """Checks an SQL query is valid without running it
+    
+    Args:
+        sql: string, the SQL command to be checked
+        
+    Returns:
+        int, number of bytes the query would process
+        
+    Raises:
+        ValueError, if BigQuery rejects the query - the message gives 
+            BigQuery's reason
+    """
+    job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+    try:
+        query_job = SESSION.query(sql, job_config=job_config)
+    except gcp_exceptions.BadRequest as e:
+        raise ValueError(f"Invalid query: {e.message}") from e
+    return query_job.total_bytes_processed
 
         
 def check_dataset_exists(dataset_id):
@@ -153,11 +1157,13 @@ def check_dataset_exists(dataset_id):
     Returns:
         bool, True if dataset named in "dataset_id" exists, otherwise False
     """
-    try:
-        CLIENT.get_dataset(dataset_id)
-        return True
-    except:
-        return False
+    def fetch_dataset_exists():
+        try:
+            SESSION.get_dataset(dataset_id)
+            return True
+        except:
+            return False
+    return _metadata_cache.get("dataset:" + dataset_id, fetch_dataset_exists)
 
 
 def check_table_exists(full_table_id):
@@ -169,11 +1175,7 @@ def check_table_exists(full_table_id):
     Returns:
         bool, True if table named in "table_id" exists, otherwise False
     """
-    try:
-        CLIENT.get_table(full_table_id)
-        return True
-    except:
-        return False
+    return get_table_metadata(full_table_id) is not None
         
         
 def get_table_schema_dict(full_table_id):
@@ -200,11 +1202,98 @@ def get_table_schema_dict(full_table_id):
     Returns:
         dict, column name: colum data type pairs 
     """
-    table = CLIENT.get_table(full_table_id)
+    table = get_table_metadata(full_table_id)
+    if table is None:
+        raise gcp_exceptions.NotFound(f"Table {full_table_id} not found")
     return {field.name: field.field_type  
             for field in table.schema}
                                                                                                           
     
+def upload_parsed_date_lookup(dates_df, full_table_id, append=False):
+    """Uploads a raw -> parsed date lookup to BigQuery
+    
+    Only the distinct date_format/date/parsed_date rows are uploaded, so a date 
+    shared by several date columns or tables appears in the lookup once per 
+    date format.
+    
+    Args:
+        dates_df: pandas.DataFrame, with date_format, date and parsed_date 
+            columns (see `parse_date_lookup`)
+        full_table_id: string, full id of the lookup table i.e. 
+            "project_id.dataset_id.table_id"
+        append: bool (default False), if True rows are appended to an existing
+            lookup table, otherwise any existing table is replaced
+            
+    Returns:
+        None
+    """
+    lookup_df = dates_df[["date_format", "date", "parsed_date"]].drop_duplicates(
+        subset=["date_format", "date"]
+    )
+    SESSION.write_dataframe(lookup_df, full_table_id, 
+                            schema=PARSED_DATE_LOOKUP_SCHEMA, append=append)
+    
+    
+def upload_parsed_dates(unparsed_dates_sql, full_table_id, batch_size=None,
+                        n_workers=None):
+    """Parses dates BigQuery can't parse and uploads them as a lookup table
+    
+    Reads the raw dates returned by unparsed_dates_sql, parses them with 
+    `parse_date_lookup` - each distinct date is parsed once in a vectorised 
+    pass using a format inferred from a sample, with anything that doesn't fit
+    the format falling back to the dateutil parser - and uploads the parsed 
+    dates as a raw -> parsed lookup (see `upload_parsed_date_lookup`) that can
+    be joined back to source tables on the date format and raw date value.
+    
+    If batch_size is set, rather than reading all the raw dates into one 
+    DataFrame, they're read as Arrow record batches of at most batch_size rows,
+    and each batch is parsed and appended to the lookup before moving on to the
+    next - so client memory use stays flat regardless of table size.
+    
+    Args:
+        unparsed_dates_sql: string, SQL query with date_key, date_format and 
+            date columns (see `FDMTable._get_unparsed_dates_sql`)
+        full_table_id: string, full id of the lookup table i.e. 
+            "project_id.dataset_id.table_id"
+        batch_size: int (default None), max number of rows read/parsed/uploaded
+            at once - by default all rows are read at once
+        n_workers: int (default None), number of processes used to parse dates 
+            with the dateutil parser - defaults to available CPUs
+            
+    Returns:
+        set, date_keys with at least one date parsed and uploaded - the lookup 
+            table is only created if this isn't empty
+    """
+    if batch_size:
+        batches = SESSION.read_query_batches(unparsed_dates_sql, batch_size)
+    else:
+        batches = [SESSION.read_query(unparsed_dates_sql, use_cache=False)]
+        
+    all_dates_short = {}
+    parsed_date_keys = set()
+    for dates_df in batches:
+        if dates_df.empty:
+            continue
+        for date_key, key_dates_df in dates_df.groupby("date_key"):
+            all_dates_short[date_key] = (
+                all_dates_short.get(date_key, True) and 
+                all(key_dates_df.date.apply(date_is_short))
+            )
+        dates_df = parse_date_lookup(dates_df, n_workers=n_workers)
+        dates_df = dates_df[dates_df.parsed_date.notna()]
+        if dates_df.empty:
+            continue
+        upload_parsed_date_lookup(dates_df, full_table_id, 
+                                  append=bool(parsed_date_keys))
+        parsed_date_keys.update(dates_df.date_key)
+    save_date_parse_cache()
+        
+    for date_key, dates_short in all_dates_short.items():
+        if dates_short:
+            print(TWO_CHARACTER_YEAR_WARNING)
+    return parsed_date_keys
+    
+    
 def build_id_map_error_table(id_a, id_b, map_table, destination_dataset):
     
     count_a = f"COUNT({id_a}) OVER (PARTITION BY {id_a})"
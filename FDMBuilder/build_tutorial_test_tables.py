@@ -9,7 +9,7 @@ persons_sql = """
     FROM `CB_FDM_MASTER.person`
     LIMIT 50
 """
-persons = CLIENT.query(persons_sql).to_dataframe() 
+persons = SESSION.query(persons_sql).to_dataframe() 
 
 # collect another 50 random people with a death_datetime from person table
 dead_persons_sql = """
@@ -18,7 +18,7 @@ dead_persons_sql = """
     WHERE death_datetime IS NOT NULL
     LIMIT 50
 """
-dead_persons = CLIENT.query(dead_persons_sql).to_dataframe() 
+dead_persons = SESSION.query(dead_persons_sql).to_dataframe() 
 
 # stitch together the two sets of random people to form a 100 person dataframe
 test_table_1 = persons.append(dead_persons).reset_index(drop=True)
@@ -64,7 +64,7 @@ persons_2_sql = """
     WHERE digest IS NOT NULL
     LIMIT 50
 """
-persons_2 = CLIENT.query(persons_2_sql).to_dataframe()
+persons_2 = SESSION.query(persons_2_sql).to_dataframe()
 # select random entries from master person table with a death_datetime and a 
 # corresponding digest
 dead_persons_2_sql = """
@@ -76,7 +76,7 @@ dead_persons_2_sql = """
     AND death_datetime IS NOT NULL
     LIMIT 50
 """
-dead_persons_2 = CLIENT.query(dead_persons_2_sql).to_dataframe()
+dead_persons_2 = SESSION.query(dead_persons_2_sql).to_dataframe()
 # stich two dataframes together
 test_table_2 = persons_2.append(dead_persons_2).reset_index(drop=True)
 # create some nonesense digests for testing
@@ -146,7 +146,7 @@ persons_3_sql = """
     WHERE EDRN IS NOT NULL
     LIMIT 50
 """
-persons_3 = CLIENT.query(persons_3_sql).to_dataframe()
+persons_3 = SESSION.query(persons_3_sql).to_dataframe()
 
 dead_persons_3_sql = """
     SELECT demo.EDRN, person.birth_datetime, person.death_datetime
@@ -157,7 +157,7 @@ dead_persons_3_sql = """
     AND death_datetime IS NOT NULL
     LIMIT 50
 """
-dead_persons_3 = CLIENT.query(dead_persons_3_sql).to_dataframe()
+dead_persons_3 = SESSION.query(dead_persons_3_sql).to_dataframe()
 
 test_table_3 = persons_3.append(dead_persons_3).reset_index(drop=True)
 
@@ -0,0 +1,765 @@
+import atexit
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import itertools
+import json
+import os
+import re
+from FDMBuilder.lazy_imports import lazy_import
+
+dateutil_parser = lazy_import("dateutil.parser")
+pd = lazy_import("pandas")
+
+# yearfirst/dayfirst settings passed to the dateutil parser for each of the
+# supported date formats
+DATE_FORMAT_SETTINGS = {
+    "YMD": [True, False],
+    "YDM": [True, True],
+    "DMY": [False, True],
+    "MDY": [False, False]
+}
+# strftime components used to build the candidate formats tried when inferring
+# the format of a date column. 2 character years (%y) are deliberately left
+# out - strptime and dateutil disagree on which century they belong to, so
+# these are always handed to dateutil
+NUMERIC_DATE_ORDERS = {
+    (True, False): ("%Y", "%m", "%d"),
+    (True, True): ("%Y", "%d", "%m"),
+    (False, True): ("%d", "%m", "%Y"),
+    (False, False): ("%m", "%d", "%Y")
+}
+DATE_SEPARATORS = ["-", "/", ".", " ", ""]
+TIME_SUFFIXES = ["", " %H:%M:%S", "T%H:%M:%S", " %H:%M:%S.%f",
+                 "T%H:%M:%S.%f", " %H:%M"]
+FORMAT_SAMPLE_SIZE = 1000
+# below this many values the cost of starting worker processes outweighs any
+# gain from parsing with dateutil in parallel
+PARALLEL_PARSE_MIN_VALUES = 10000
+DATE_PARSE_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".fdm_builder",
+                                     "date_parse_cache.json")
+DATE_PARSE_CACHE_MAX_SIZE = 500000
+# number of distinct values sampled to check a date format, and how much worse
+# (as a fraction of the sample) a date format can fit the sample than the best
+# fitting format before it's considered wrong
+DATE_FORMAT_CHECK_SAMPLE_SIZE = 5000
+DATE_FORMAT_TOLERANCE = 0.05
+# regex patterns used to check a raw date string fully matches a format before 
+# it's parsed in BigQuery - PARSE_DATETIME is more lenient than the dateutil 
+# parser (e.g. %Y will happily accept 2 character years) so every element is 
+# pinned down to what dateutil would read the same way
+SQL_FORMAT_ELEMENT_PATTERNS = {
+    "%Y": r"[1-9]\d{3}",
+    "%m": r"\d{1,2}",
+    "%d": r"\d{1,2}",
+    "%b": r"[A-Za-z]{3}",
+    "%B": r"[A-Za-z]+",
+    "%H": r"\d{2}",
+    "%M": r"\d{2}",
+    "%S": r"\d{2}",
+}
+
+
+def parse_date(x, yearfirst, dayfirst):
+    """Parses a single date with the dateutil parser
+
+    The reference behaviour for all date parsing in FDMBuilder - any faster
+    parsing route must return exactly what this function would.
+
+    Args:
+        x: any, value containing date information - converted to a string
+            before parsing
+        yearfirst: bool, if the year appears first in the date info
+        dayfirst: bool, if day appears before month
+
+    Returns:
+        datetime.datetime, parsed date -- or -- None if x can't be parsed
+    """
+    if type(x) is datetime.datetime:
+        x = x.date
+    try:
+        return dateutil_parser.parse(str(x), dayfirst=dayfirst, 
+                                     yearfirst=yearfirst)
+    except:
+        return None
+    
+    
+# dateutil parser that notes if each date it parses had a year, month and day,
+# see _get_completeness_parser
+_completeness_parser = None
+
+
+def _get_completeness_parser():
+    """Gets a dateutil parser that notes if dates are complete
+    
+    Parses exactly as `dateutil.parser.parse` does, but after each parse its
+    date_is_complete attribute is False if the date was missing a year, month
+    or day (which dateutil takes from today's date).
+    
+    Returns:
+        dateutil.parser.parser
+    """
+    global _completeness_parser
+    if _completeness_parser is None:
+        class CompletenessParser(dateutil_parser.parser):
+            def _build_naive(self, res, default):
+                self.date_is_complete = None not in (res.year, res.month, 
+                                                     res.day)
+                return super()._build_naive(res, default)
+        _completeness_parser = CompletenessParser()
+    return _completeness_parser
+
+
+def _parse_date_checking_complete(x, yearfirst, dayfirst):
+    """Parses a single date as `parse_date` does, noting if it was complete
+    
+    Args:
+        x: any, value containing date information
+        yearfirst: bool, if the year appears first in the date info
+        dayfirst: bool, if day appears before month
+        
+    Returns:
+        tuple, (parsed date or None, bool) - the bool is False if the date was
+            completed with part of today's date
+    """
+    if type(x) is datetime.datetime:
+        x = x.date
+    parser = _get_completeness_parser()
+    parser.date_is_complete = True
+    try:
+        parsed_date = parser.parse(str(x), dayfirst=dayfirst, 
+                                   yearfirst=yearfirst)
+    except:
+        parsed_date = None
+    return parsed_date, parser.date_is_complete
+
+
+def _parse_date_chunk(dates, yearfirst, dayfirst, check_complete=False):
+    """Parses a list of dates with `parse_date` - run in worker processes
+
+    Args:
+        dates: list, values containing date information
+        yearfirst: bool, if the year appears first in the date info
+        dayfirst: bool, if day appears before month
+        check_complete: bool (default False), see `parse_dates_with_dateutil`
+
+    Returns:
+        list, parsed datetimes or None, in the same order as dates
+    """
+    if check_complete:
+        return [_parse_date_checking_complete(x, yearfirst, dayfirst) 
+                for x in dates]
+    return [parse_date(x, yearfirst=yearfirst, dayfirst=dayfirst) 
+            for x in dates]
+
+
+def parse_dates_with_dateutil(dates, yearfirst, dayfirst, n_workers=None,
+                              check_complete=False):
+    """Parses a list of dates with dateutil, sharded across processes
+
+    The dateutil parser is pure python, so large lists of dates are split into
+    one contiguous chunk per worker and parsed in a process pool, then 
+    stitched back together in their original order.
+
+    Args:
+        dates: list, values containing date information
+        yearfirst: bool, if the year appears first in the date info
+        dayfirst: bool, if day appears before month
+        n_workers: int (default None), number of worker processes - defaults
+            to the number of available CPUs. 1 parses in the current process.
+        check_complete: bool (default False), if True each date is returned 
+            with a bool, False if dateutil completed the date with part of 
+            today's date (see `_parse_date_checking_complete`)
+
+    Returns:
+        list, parsed datetimes or None -- or -- (parsed date, bool) tuples if
+            check_complete, in the same order as dates
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    if n_workers <= 1 or len(dates) < PARALLEL_PARSE_MIN_VALUES:
+        return _parse_date_chunk(dates, yearfirst, dayfirst, check_complete)
+    
+    chunk_size = -(-len(dates) // n_workers)
+    chunks = [dates[i:i + chunk_size] 
+              for i in range(0, len(dates), chunk_size)]
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        parsed_chunks = executor.map(_parse_date_chunk, chunks,
+                                     [yearfirst] * len(chunks),
+                                     [dayfirst] * len(chunks),
+                                     [check_complete] * len(chunks))
+        return [x for parsed_chunk in parsed_chunks for x in parsed_chunk]
+
+
+class DateParseCache:
+    """A persistent, size capped cache of parsed dates
+    
+    Maps (raw date string, yearfirst, dayfirst) to the parsed datetime (or 
+    None if the string can't be parsed) so that date strings that repeat across
+    tables and builds are only ever parsed once. Least recently used entries 
+    are evicted once the cache holds more than max_size entries. The cache is 
+    stored as a JSON list of [date string, yearfirst, dayfirst, ISO format 
+    date or null] entries, least recently used first - plain data, so 
+    loading the file can't run any code.
+    
+    Args:
+        path: string, location of the cache file - created on first save if it
+            doesn't already exist
+        max_size: int, max number of entries held in the cache
+        
+    Attributes:
+        path: location of the cache file
+        max_size: max number of entries held in the cache
+    """
+    
+    def __init__(self, path=DATE_PARSE_CACHE_PATH, 
+                 max_size=DATE_PARSE_CACHE_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._changed = False
+        if os.path.exists(path):
+            try:
+                with open(path) as cache_file:
+                    self._entries = OrderedDict(
+                        ((date_string, yearfirst, dayfirst), 
+                         None if parsed_date is None 
+                         else datetime.datetime.fromisoformat(parsed_date))
+                        for date_string, yearfirst, dayfirst, parsed_date 
+                        in json.load(cache_file)
+                    )
+            except (ValueError, TypeError):
+                # unreadable (e.g. partly written) caches are started again
+                self._entries = OrderedDict()
+                
+    def __len__(self):
+        return len(self._entries)
+    
+    def get(self, date_strings, yearfirst, dayfirst):
+        """Looks up previously parsed dates
+        
+        Args:
+            date_strings: iterable, raw date strings
+            yearfirst: bool, if the year appears first in the date info
+            dayfirst: bool, if day appears before month
+            
+        Returns:
+            dict, raw date string: parsed datetime/None for each of 
+                date_strings found in the cache
+        """
+        found = {}
+        for date_string in set(date_strings):
+            key = (date_string, yearfirst, dayfirst)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                found[date_string] = self._entries[key]
+        return found
+    
+    def update(self, date_strings, parsed_dates, yearfirst, dayfirst):
+        """Adds parsed dates to the cache, evicting old entries as required
+        
+        Args:
+            date_strings: iterable, raw date strings
+            parsed_dates: iterable, parsed datetime/None for each of 
+                date_strings
+            yearfirst: bool, if the year appears first in the date info
+            dayfirst: bool, if day appears before month
+            
+        Returns:
+            None
+        """
+        for date_string, parsed_date in zip(date_strings, parsed_dates):
+            if pd.isna(parsed_date):
+                parsed_date = None
+            else:
+                parsed_date = pd.Timestamp(parsed_date).to_pydatetime()
+            self._entries[(date_string, yearfirst, dayfirst)] = parsed_date
+            self._changed = True
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def save(self):
+        """Writes the cache to disk if any entries have been added
+        
+        Returns:
+            None
+        """
+        if not self._changed:
+            return None
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as cache_file:
+            json.dump([
+                [date_string, yearfirst, dayfirst, 
+                 None if parsed_date is None else parsed_date.isoformat()]
+                for (date_string, yearfirst, dayfirst), parsed_date 
+                in self._entries.items()
+            ], cache_file)
+        os.replace(tmp_path, self.path)
+        self._changed = False
+        
+    def clear(self):
+        """Removes every entry from the cache, including the file on disk
+        
+        Returns:
+            None
+        """
+        self._entries = OrderedDict()
+        self._changed = False
+        if os.path.exists(self.path):
+            os.remove(self.path)
+            
+            
+# cache consulted by parse_dates - None (the default) means no caching, see 
+# use_date_parse_cache
+_date_parse_cache = None
+
+
+def use_date_parse_cache(path=DATE_PARSE_CACHE_PATH, 
+                         max_size=DATE_PARSE_CACHE_MAX_SIZE):
+    """Turns the persistent date parse cache on (or off) for all date parsing
+    
+    Once turned on, every call to `parse_dates` (and so every FDMTable build)
+    looks up dates in the cache before parsing and adds newly parsed dates to 
+    the cache afterwards. New entries are written to disk by 
+    `save_date_parse_cache` - called after each table's dates are parsed, and
+    when python exits.
+    
+    Args:
+        path: string, location of the cache file - None turns caching off
+        max_size: int, max number of entries held in the cache
+        
+    Returns:
+        DateParseCache, the cache now in use -- or -- None if caching was 
+            turned off
+        
+    Example:
+    ```python
+    from FDMBuilder.date_helpers import use_date_parse_cache
+    use_date_parse_cache()
+    my_table.quick_build(...)  # dates parsed here are cached for next time
+    ```
+    """
+    global _date_parse_cache
+    _date_parse_cache = None if path is None else DateParseCache(path, max_size)
+    return _date_parse_cache
+
+
+@atexit.register
+def save_date_parse_cache():
+    """Writes any new entries in the date parse cache to disk
+    
+    Entries are only held in memory as dates are parsed, so saving the cache
+    (which rewrites the whole file) happens once per table rather than once 
+    per batch of dates. Does nothing if the cache isn't turned on.
+    
+    Returns:
+        None
+    """
+    if _date_parse_cache is not None:
+        _date_parse_cache.save()
+
+
+def date_is_short(date):
+    """Checks if a raw date is too short to contain a 4 character year
+
+    Args:
+        date: any, raw date value
+
+    Returns:
+        bool, True if date is a string of 8 or fewer characters or is empty, 
+            otherwise False
+    """
+    if type(date) is str and len(date) <= 8:
+        return True
+    elif not date:
+        return True
+    else:
+        return False
+
+
+def _candidate_date_formats(yearfirst, dayfirst):
+    """Lists strftime formats that might describe a column of dates
+
+    Numeric formats are only generated in the order given by yearfirst/
+    dayfirst, as any other order would contradict the dateutil parser. Formats
+    with month names are generated in every order, as the month name and 4
+    character year make these unambiguous.
+
+    Args:
+        yearfirst: bool, if the year appears first in the date info
+        dayfirst: bool, if day appears before month
+
+    Returns:
+        list, strftime format strings, most likely formats first
+    """
+    numeric_order = NUMERIC_DATE_ORDERS[(yearfirst, dayfirst)]
+    date_formats = [sep.join(numeric_order) for sep in DATE_SEPARATORS]
+    for month in ["%b", "%B"]:
+        for order in itertools.permutations(["%Y", month, "%d"]):
+            date_formats += [sep.join(order) for sep in DATE_SEPARATORS]
+    return [date_format + time_suffix
+            for time_suffix in TIME_SUFFIXES
+            for date_format in date_formats]
+
+
+def infer_date_format(dates, yearfirst, dayfirst,
+                      sample_size=FORMAT_SAMPLE_SIZE):
+    """Infers an explicit strftime format from a sample of date strings
+
+    Tries each candidate format against a sample of the non-null values and
+    keeps the one that parses the most values, so long as every value it
+    parses matches the result of the dateutil parser.
+
+    Args:
+        dates: pandas.Series, strings containing date information
+        yearfirst: bool, if the year appears first in the date info
+        dayfirst: bool, if day appears before month
+        sample_size: int, max number of values used to infer the format
+
+    Returns:
+        string, strftime format -- or -- None if no candidate format matches
+            any of the sampled dates
+    """
+    sample = dates.dropna()
+    if sample.empty:
+        return None
+    if len(sample) > sample_size:
+        sample = sample.sample(n=sample_size, random_state=0)
+    sample = sample.astype(str)
+    expected = pd.Series(
+        [parse_date(x, yearfirst=yearfirst, dayfirst=dayfirst) for x in sample],
+        index=sample.index, dtype=object
+    )
+
+    best_format = None
+    best_n_parsed = 0
+    for date_format in _candidate_date_formats(yearfirst, dayfirst):
+        parsed = pd.to_datetime(sample, format=date_format, errors="coerce")
+        is_parsed = parsed.notna()
+        n_parsed = is_parsed.sum()
+        if n_parsed <= best_n_parsed:
+            continue
+        if not (parsed[is_parsed] == expected[is_parsed]).all():
+            continue
+        best_format = date_format
+        best_n_parsed = n_parsed
+        if n_parsed == len(sample):
+            break
+    return best_format
+
+
+def parse_dates(dates, yearfirst, dayfirst, n_workers=None):
+    """Parses a column of dates, matching the dateutil parser row for row
+
+    Infers a strftime format from a sample of the dates and parses the whole
+    column with it in one vectorised pass. Only the values that don't fit the
+    inferred format are handed on to the (much slower) dateutil parser. If the
+    date parse cache is turned on (see `use_date_parse_cache`) only values that
+    aren't already in the cache are parsed at all.
+
+    Args:
+        dates: pandas.Series, values containing date information
+        yearfirst: bool, if the year appears first in the date info
+        dayfirst: bool, if day appears before month
+        n_workers: int (default None), number of processes used for any dates
+            that fall back to dateutil - see `parse_dates_with_dateutil`
+
+    Returns:
+        pandas.Series, object dtype with the same index as dates, containing
+            datetimes or None where the value couldn't be parsed
+    """
+    parsed_dates = pd.Series(None, index=dates.index, dtype=object)
+    not_null = dates.notna()
+    if not not_null.any():
+        return parsed_dates
+    date_strings = dates[not_null].astype(str)
+    
+    cache = _date_parse_cache
+    if cache is not None:
+        cached = cache.get(date_strings, yearfirst, dayfirst)
+        is_cached = date_strings.isin(cached.keys())
+        parsed_dates.loc[is_cached[is_cached].index] = [
+            cached[x] for x in date_strings[is_cached]
+        ]
+        date_strings = date_strings[~is_cached]
+        if date_strings.empty:
+            return parsed_dates
+
+    needs_dateutil = pd.Series(True, index=date_strings.index)
+    date_format = infer_date_format(date_strings, yearfirst, dayfirst)
+    if date_format is not None:
+        fast_parsed = pd.to_datetime(date_strings, format=date_format,
+                                     errors="coerce")
+        is_parsed = fast_parsed.notna()
+        parsed_dates.loc[is_parsed[is_parsed].index] = (
+            fast_parsed[is_parsed].astype(object)
+        )
+        needs_dateutil = ~is_parsed
+
+    residue = date_strings[needs_dateutil]
+    # dates missing a year, month or day are completed from today's date, so
+    # they're only valid today and aren't cached
+    is_partial = pd.Series(False, index=date_strings.index)
+    if not residue.empty:
+        residue_parsed = parse_dates_with_dateutil(
+            list(residue), yearfirst=yearfirst, dayfirst=dayfirst,
+            n_workers=n_workers, check_complete=cache is not None
+        )
+        if cache is not None:
+            is_partial.loc[residue.index] = [
+                not is_complete for _, is_complete in residue_parsed
+            ]
+            residue_parsed = [parsed_date for parsed_date, _ in residue_parsed]
+        parsed_dates.loc[residue.index] = residue_parsed
+    if cache is not None:
+        cacheable = date_strings[~is_partial]
+        cache.update(cacheable, parsed_dates[cacheable.index], 
+                     yearfirst, dayfirst)
+    return parsed_dates
+
+
+def _sql_date_formats(yearfirst, dayfirst):
+    """Lists PARSE_DATETIME formats that agree with the dateutil parser
+
+    Numeric formats follow the order given by yearfirst/dayfirst, with the 
+    exception of unseparated 8 digit dates which dateutil reads as YYYYMMDD 
+    unless dayfirst is set, in which case it reads them as YYYYDDMM whenever 
+    both pairs could be a month. Those are only included for dayfirst when 
+    the last pair must be the day (see `_sql_format_regex`). Formats with 
+    month names are generated in every order.
+
+    Args:
+        yearfirst: bool, if the year appears first in the date info
+        dayfirst: bool, if day appears before month
+
+    Returns:
+        list, BigQuery format strings
+    """
+    numeric_order = NUMERIC_DATE_ORDERS[(yearfirst, dayfirst)]
+    sql_formats = ["%Y%m%d"]
+    for sep in ["-", "/", ".", " "]:
+        sql_formats.append(sep.join(numeric_order))
+    for sep in ["-", "/"]:
+        sql_formats += [sep.join(numeric_order) + time_suffix 
+                        for time_suffix in [" %H:%M:%S", "T%H:%M:%S"]]
+    for month in ["%b", "%B"]:
+        for order in itertools.permutations(["%Y", month, "%d"]):
+            sql_formats += [sep.join(order) for sep in ["-", "/", " "]]
+    return sql_formats
+
+
+def _sql_format_regex(sql_format, dayfirst=False):
+    """Converts a PARSE_DATETIME format into a regex matching the whole string
+
+    Args:
+        sql_format: string, BigQuery format string e.g. "%d/%m/%Y"
+        dayfirst: bool (default False), if day appears before month. With 
+            dayfirst the "%Y%m%d" regex only matches dates whose day is over 
+            12, as dateutil reads the rest as YYYYDDMM
+
+    Returns:
+        string, regex pattern
+    """
+    if sql_format == "%Y%m%d":
+        if dayfirst:
+            return r"^[1-9]\d{3}(0[1-9]|1[0-2])(1[3-9]|2\d|3[01])$"
+        return r"^[1-9]\d{7}$"
+    # separators are all literal characters in BigQuery's RE2 syntax except "."
+    elements = re.split(r"(%[A-Za-z])", sql_format)
+    return "^" + "".join(
+        SQL_FORMAT_ELEMENT_PATTERNS.get(element, element.replace(".", r"\."))
+        for element in elements
+    ) + "$"
+
+
+def build_sql_date_parse(raw_date_sql, yearfirst, dayfirst):
+    """Builds a BigQuery SQL expression that parses dates server side
+
+    The expression tries each format from `_sql_date_formats` in turn, only
+    parsing a value with a format when it matches the format's regex exactly, 
+    so that anything the expression parses is parsed exactly as the dateutil 
+    parser would. Values that don't match any of the formats are NULL and 
+    should be parsed with `parse_dates`.
+
+    Args:
+        raw_date_sql: string, SQL expression returning the raw date STRING
+        yearfirst: bool, if the year appears first in the date info
+        dayfirst: bool, if day appears before month
+
+    Returns:
+        string, SQL expression returning a DATETIME or NULL
+
+    Example:
+    ```python
+    parse_sql = build_sql_date_parse("date_col", yearfirst=False, dayfirst=True)
+    sql = f"SELECT {parse_sql} AS parsed_date FROM `project.dataset.table`"
+    ```
+    """
+    candidates_sql = ",\n".join(
+        f'IF(REGEXP_CONTAINS({raw_date_sql}, r"{_sql_format_regex(sql_format, dayfirst)}"), '
+        f'SAFE.PARSE_DATETIME("{sql_format}", {raw_date_sql}), NULL)'
+        for sql_format in _sql_date_formats(yearfirst, dayfirst)
+    )
+    return f"COALESCE(\n{candidates_sql}\n)"
+
+
+def parse_date_lookup(dates_df, n_workers=None):
+    """Parses a DataFrame of raw dates, each with its own date format
+
+    Each distinct (date format, raw date) pair is parsed only once with 
+    `parse_dates`, however many times it appears in dates_df - so dates shared 
+    between several date columns or tables are only parsed once.
+
+    Args:
+        dates_df: pandas.DataFrame, with a date_format column (one of "YMD", 
+            "YDM", "DMY", "MDY") and a date column of raw date strings
+        n_workers: int (default None), number of processes used for any dates
+            that fall back to dateutil - see `parse_dates_with_dateutil`
+
+    Returns:
+        pandas.DataFrame, dates_df with a parsed_date column added
+    """
+    dates_df["parsed_date"] = pd.Series(None, index=dates_df.index, 
+                                        dtype=object)
+    for date_format, format_dates_df in dates_df.groupby("date_format"):
+        yearfirst, dayfirst = DATE_FORMAT_SETTINGS[date_format]
+        distinct_dates = format_dates_df.date.drop_duplicates()
+        parsed_dates = parse_dates(distinct_dates, 
+                                   yearfirst=yearfirst, 
+                                   dayfirst=dayfirst,
+                                   n_workers=n_workers)
+        parsed_lookup = dict(zip(distinct_dates, parsed_dates))
+        dates_df.loc[format_dates_df.index, "parsed_date"] = [
+            parsed_lookup[date] for date in format_dates_df.date
+        ]
+    return dates_df
+
+
+def _date_fits_format(date_string, date_format):
+    """Checks the day/month/year info in a date string fits a date format
+
+    Looks at the first three numbers/words in the string and checks each is in
+    range for the part of the date the format says it is i.e. days 1-31, months
+    1-12 and 2 or 4 digit years.
+
+    Args:
+        date_string: string, raw date
+        date_format: string, one of "YMD", "YDM", "DMY", "MDY"
+
+    Returns:
+        bool, True if the string fits the format -- or -- None if the string
+            doesn't contain 3 separate numeric date parts (e.g. "20200115" or 
+            "15-Jan-2002") and so reads the same in any format
+    """
+    tokens = re.findall(r"[A-Za-z]+|\d+", date_string)[:3]
+    if len(tokens) < 3 or any(token.isalpha() for token in tokens):
+        return None
+    for part, token in zip(date_format, tokens):
+        if part == "Y":
+            fits = token.isdigit() and len(token) in [2, 4]
+        elif part == "M":
+            fits = token.isdigit() and 1 <= int(token) <= 12
+        else:
+            fits = token.isdigit() and 1 <= int(token) <= 31
+        if not fits:
+            return False
+    return True
+
+
+def score_date_formats(dates):
+    """Scores how well each supported date format fits a sample of dates
+
+    A date counts towards a format's score if it can be parsed with the 
+    format's dateutil settings and, where it has separate day/month/year parts,
+    each part is in range for the position the format gives it (see 
+    `_date_fits_format`) - so dates the parser could only read by silently 
+    swapping day and month don't count.
+
+    Args:
+        dates: pandas.Series, raw date strings
+
+    Returns:
+        dict, date format: fraction of non-null dates that fit the format
+    """
+    date_strings = dates.dropna().astype(str)
+    scores = {}
+    for date_format, (yearfirst, dayfirst) in DATE_FORMAT_SETTINGS.items():
+        if date_strings.empty:
+            scores[date_format] = 0.0
+            continue
+        n_fit = 0
+        for date_string in date_strings:
+            if _date_fits_format(date_string, date_format) is False:
+                continue
+            if parse_date(date_string, yearfirst, dayfirst) is not None:
+                n_fit += 1
+        scores[date_format] = n_fit / len(date_strings)
+    return scores
+
+
+def describe_date_format_scores(scores):
+    """Summarises the scores from `score_date_formats` as a string
+
+    Args:
+        scores: dict, date format: fraction of dates that fit the format
+
+    Returns:
+        string, e.g. "YMD: 0%, YDM: 0%, DMY: 100%, MDY: 35%"
+    """
+    return ", ".join(f"{date_format}: {score:.0%}" 
+                     for date_format, score in scores.items())
+
+
+def detect_date_format(dates, date_format=None, 
+                       tolerance=DATE_FORMAT_TOLERANCE):
+    """Recommends or confirms the format of a sample of dates
+
+    Args:
+        dates: pandas.Series, sample of raw date strings
+        date_format: string (default None), one of "YMD", "YDM", "DMY", "MDY" -
+            the format to confirm. If None, the best fitting format is 
+            recommended (YMD if the dates read the same in any format).
+        tolerance: float, how much worse than the best fitting format (as a 
+            fraction of the sample) date_format can fit and still be accepted
+
+    Returns:
+        tuple, (date format, scores) - the confirmed/recommended date format 
+            and the scores from `score_date_formats`
+
+    Raises:
+        ValueError, if none of the dates can be parsed in any format, if 
+            date_format fits clearly worse than another format, or if 
+            date_format isn't given and two or more formats fit equally well
+    """
+    scores = score_date_formats(dates)
+    best_score = max(scores.values())
+    best_formats = [fmt for fmt, score in scores.items() if score == best_score]
+    scores_string = describe_date_format_scores(scores)
+    if best_score == 0:
+        raise ValueError(f"""
+    None of the sampled dates could be parsed in any of the YMD/YDM/DMY/MDY 
+    formats. Check the date column(s) contain date information.
+            """)
+    if date_format is not None:
+        if scores[date_format] < best_score - tolerance:
+            raise ValueError(f"""
+    Dates don't look like they're in {date_format} format - only 
+    {scores[date_format]:.0%} of sampled dates fit {date_format}, compared to 
+    {best_score:.0%} for {"/".join(best_formats)}. Share of sampled dates 
+    fitting each format: {scores_string}
+            """)
+        return date_format, scores
+    # dates without separate numeric day/month/year parts read the same in any
+    # format, so fall back on the default
+    checkable = [_date_fits_format(date_string, "YMD") is not None 
+                 for date_string in dates.dropna().astype(str)]
+    if not any(checkable):
+        return "YMD", scores
+    if len(best_formats) > 1:
+        raise ValueError(f"""
+    Date format is ambiguous - the sampled dates fit {"/".join(best_formats)} 
+    equally well ({best_score:.0%} of sampled dates). Check the source data 
+    documentation to find out which format is correct.
+            """)
+    return best_formats[0], scores
@@ -0,0 +1,43 @@
+import importlib
+import importlib.util
+import sys
+
+
+def lazy_import(module_name):
+    """Imports a module that's only loaded when first used
+
+    Returns a module object straight away, but the module's code only runs
+    (importing all its own dependencies) the first time one of its attributes
+    is accessed. Used for heavy dependencies (pandas, google-cloud-bigquery
+    etc.) so importing FDMBuilder stays quick and they're only loaded when the
+    code that needs them runs.
+
+    Args:
+        module_name: string, full name of the module e.g. "pandas" or
+            "google.cloud.bigquery"
+
+    Returns:
+        module, the (not yet loaded) module
+
+    Example:
+    ```python
+    pd = lazy_import("pandas")  # pandas isn't loaded yet
+    pd.DataFrame()  # pandas is loaded here
+    ```
+    """
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.find_spec(module_name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{module_name}'")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    loader.exec_module(module)
+    # as with a normal import, make the module an attribute of its package so
+    # e.g. google.api_core.exceptions can be reached from google.api_core
+    parent_name, _, child_name = module_name.rpartition(".")
+    if parent_name:
+        setattr(sys.modules[parent_name], child_name, module)
+    return module
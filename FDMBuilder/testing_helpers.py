@@ -1,13 +1,5 @@
 import datetime
 from FDMBuilder.FDM_helpers import *
-from google.cloud import bigquery
-import pandas as pd
-import numpy as np 
-
-
-# Set global variables
-PROJECT = "yhcr-prd-phm-bia-core"
-CLIENT = bigquery.Client(project=PROJECT)
 
 
 def generate_random_dates(n=1, from_year=1950, to_year=2022):
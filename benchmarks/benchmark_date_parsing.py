@@ -0,0 +1,311 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from FDMBuilder.date_helpers import parse_date_lookup
+import numpy as np
+import pandas as pd
+
+# Benchmarks the python side of date parsing (`parse_date_lookup` - the step
+# `upload_parsed_dates` runs on the raw dates downloaded from BigQuery) against
+# synthetic date columns in every layout FDMTable supports. Runs entirely
+# offline - run from the root of the repo, e.g.:
+#
+#   python -m benchmarks.benchmark_date_parsing --output results.json
+#   python -m benchmarks.benchmark_date_parsing --output new.json \
+#       --compare results.json
+#
+# Results are written as JSON records, one per layout/size, so runs from
+# different versions of the package can be compared with --compare.
+
+BENCHMARK_SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+MONTH_NAMES = np.array(["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+                        "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"])
+GARBAGE_DATES = np.array(["unknown", "00/00/0000", "31/02/2020", "n/a",
+                          "99/99/9999", "?", "TBC"])
+REGRESSION_THRESHOLD = 0.1
+
+
+def _random_date_parts(n, rng, from_year=1950, to_year=2022):
+    """Generates string year/month/day parts for n random dates
+
+    Args:
+        n: int, number of dates to generate
+        rng: numpy.random.Generator, source of randomness
+        from_year: int, the min year dates will be taken from
+        to_year: int, the max year the dates will be taken to
+
+    Returns:
+        tuple, (years, months, days) pandas.Series of zero padded strings
+    """
+    years = pd.Series(rng.integers(from_year, to_year, n)).astype(str)
+    months = pd.Series(rng.integers(1, 13, n)).astype(str).str.zfill(2)
+    days = pd.Series(rng.integers(1, 29, n)).astype(str).str.zfill(2)
+    return years, months, days
+
+
+def _ymd_dates(n, rng):
+    years, months, days = _random_date_parts(n, rng)
+    return years + "-" + months + "-" + days, "YMD"
+
+
+def _ydm_dates(n, rng):
+    years, months, days = _random_date_parts(n, rng)
+    return years + "/" + days + "/" + months, "YDM"
+
+
+def _dmy_dates(n, rng):
+    years, months, days = _random_date_parts(n, rng)
+    return days + "/" + months + "/" + years, "DMY"
+
+
+def _mdy_dates(n, rng):
+    years, months, days = _random_date_parts(n, rng)
+    return months + "-" + days + "-" + years, "MDY"
+
+
+def _month_name_dates(n, rng):
+    years, months, days = _random_date_parts(n, rng)
+    month_names = pd.Series(MONTH_NAMES[months.astype(int) - 1])
+    return days + " " + month_names + " " + years, "DMY"
+
+
+def _two_digit_year_dates(n, rng):
+    years, months, days = _random_date_parts(n, rng)
+    return days + "/" + months + "/" + years.str[-2:], "DMY"
+
+
+def _three_col_static_dates(n, rng):
+    # mirrors FDMTable._get_raw_date_sql for a date_cols list like
+    # ["year_col", "month_col", "15"] - columns and a static day CONCATed
+    # with "-" and without zero padding
+    years, months, _ = _random_date_parts(n, rng)
+    return years + "-" + months.astype(int).astype(str) + "-15", "YMD"
+
+
+def _nulls_and_garbage_dates(n, rng):
+    dates, date_format = _dmy_dates(n, rng)
+    dates = dates.astype(object)
+    kind = rng.random(n)
+    garbage = kind < 0.1
+    dates[garbage] = rng.choice(GARBAGE_DATES, garbage.sum())
+    dates[(kind >= 0.1) & (kind < 0.3)] = None
+    return dates, date_format
+
+
+DATE_LAYOUTS = {
+    "ymd": _ymd_dates,
+    "ydm": _ydm_dates,
+    "dmy": _dmy_dates,
+    "mdy": _mdy_dates,
+    "month_names": _month_name_dates,
+    "two_digit_years": _two_digit_year_dates,
+    "three_col_static": _three_col_static_dates,
+    "nulls_and_garbage": _nulls_and_garbage_dates,
+}
+
+
+def generate_dates_df(layout, n, seed=0):
+    """Generates a synthetic raw dates DataFrame in one of DATE_LAYOUTS
+
+    Args:
+        layout: string, key of DATE_LAYOUTS
+        n: int, number of rows
+        seed: int (default 0), random seed so runs are repeatable
+
+    Returns:
+        pandas.DataFrame, with date_key, date_format and date columns in the
+            shape `upload_parsed_dates` reads from BigQuery
+    """
+    rng = np.random.default_rng(seed)
+    dates, date_format = DATE_LAYOUTS[layout](n, rng)
+    return pd.DataFrame({"date_key": "0",
+                         "date_format": date_format,
+                         "date": dates.values})
+
+
+def benchmark_parse(dates_df, n_workers=None, repeats=3):
+    """Times parsing a raw dates DataFrame and records its peak memory
+
+    The parse is timed repeats times, keeping the fastest, then run once more 
+    under tracemalloc to measure peak memory (tracemalloc slows the parse down
+    so isn't used while timing). Peak memory only covers allocations made by 
+    the benchmarking process - memory used by any dateutil worker processes 
+    (see `parse_dates_with_dateutil`) isn't included.
+
+    Args:
+        dates_df: pandas.DataFrame, see `generate_dates_df`
+        n_workers: int (default None), passed to `parse_date_lookup`
+        repeats: int (default 3), number of timed runs
+
+    Returns:
+        dict, with seconds, rows_per_sec, peak_memory_mb and parsed_fraction
+    """
+    timings = []
+    for _ in range(repeats):
+        run_df = dates_df.copy()
+        start = time.perf_counter()
+        parsed_df = parse_date_lookup(run_df, n_workers=n_workers)
+        timings.append(time.perf_counter() - start)
+    seconds = min(timings)
+    
+    run_df = dates_df.copy()
+    tracemalloc.start()
+    parse_date_lookup(run_df, n_workers=n_workers)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": seconds,
+            "rows_per_sec": len(dates_df) / seconds if seconds else None,
+            "peak_memory_mb": peak_memory / 2 ** 20,
+            "parsed_fraction": parsed_df.parsed_date.notna().mean()}
+
+
+def _get_version():
+    """Describes the version of the code being benchmarked
+
+    Returns:
+        string, the current git commit if the package is in a git repo,
+            otherwise "unknown"
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmarks(layouts=None, sizes=None, n_workers=None, repeats=3,
+                   verbose=True):
+    """Benchmarks parsing every combination of date layout and size
+
+    Args:
+        layouts: list (default None), keys of DATE_LAYOUTS - defaults to all
+        sizes: list (default None), numbers of rows - defaults to
+            BENCHMARK_SIZES
+        n_workers: int (default None), passed to `parse_date_lookup`
+        repeats: int (default 3), number of timed runs of each parse
+        verbose: bool (default True), prints each result as it's measured
+
+    Returns:
+        list, a dict for each result (see `benchmark_parse`) tagged with the
+            layout, number of rows and the version/environment it was run in
+    """
+    layouts = list(DATE_LAYOUTS.keys()) if layouts is None else layouts
+    sizes = BENCHMARK_SIZES if sizes is None else sizes
+    run_info = {"version": _get_version(),
+                "run_at": datetime.datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "pandas": pd.__version__,
+                "n_workers": n_workers,
+                "repeats": repeats}
+    results = []
+    for n in sizes:
+        for layout in layouts:
+            dates_df = generate_dates_df(layout, n)
+            result = {"layout": layout, "n_rows": n,
+                      **benchmark_parse(dates_df, n_workers=n_workers, 
+                                         repeats=repeats),
+                      **run_info}
+            results.append(result)
+            if verbose:
+                print(f"{layout:<20}{n:>10,} rows {result['rows_per_sec']:>14,.0f} "
+                      f"rows/sec {result['peak_memory_mb']:>10,.1f} MB peak")
+    return results
+
+
+def save_results(results, path):
+    """Writes benchmark results to a JSON file
+
+    Args:
+        results: list, see `run_benchmarks`
+        path: string, file to write to
+
+    Returns:
+        None
+    """
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path):
+    """Reads benchmark results written by `save_results`
+
+    Args:
+        path: string, file to read from
+
+    Returns:
+        list, see `run_benchmarks`
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_results(baseline, results, threshold=REGRESSION_THRESHOLD):
+    """Compares two sets of benchmark results layout by layout
+
+    Args:
+        baseline: list, results to compare against (see `run_benchmarks`)
+        results: list, new results
+        threshold: float (default REGRESSION_THRESHOLD), fractional drop in
+            rows/sec or rise in peak memory treated as a regression
+
+    Returns:
+        pandas.DataFrame, with baseline and new rows/sec and peak memory for
+            each layout/size in both sets of results, their ratios and a
+            regression column flagging those that are worse by more than
+            threshold
+    """
+    keys = ["layout", "n_rows"]
+    columns = keys + ["rows_per_sec", "peak_memory_mb"]
+    comparison_df = pd.merge(pd.DataFrame(baseline)[columns],
+                             pd.DataFrame(results)[columns],
+                             on=keys, suffixes=("_baseline", "_new"))
+    comparison_df["speed_ratio"] = (comparison_df.rows_per_sec_new /
+                                    comparison_df.rows_per_sec_baseline)
+    comparison_df["memory_ratio"] = (comparison_df.peak_memory_mb_new /
+                                     comparison_df.peak_memory_mb_baseline)
+    comparison_df["regression"] = (
+        (comparison_df.speed_ratio < 1 - threshold) |
+        (comparison_df.memory_ratio > 1 + threshold)
+    )
+    return comparison_df
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark FDMBuilder's python date parsing"
+    )
+    parser.add_argument("--layouts", nargs="+", choices=list(DATE_LAYOUTS),
+                        help="date layouts to benchmark (default all)")
+    parser.add_argument("--sizes", nargs="+", type=int,
+                        help="numbers of rows to benchmark (default 10^3-10^7)")
+    parser.add_argument("--workers", type=int,
+                        help="processes used for dateutil parsing")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="timed runs of each parse, fastest is kept")
+    parser.add_argument("--output", help="JSON file to write results to")
+    parser.add_argument("--compare", help="JSON file of baseline results")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.layouts, args.sizes, args.workers, 
+                             args.repeats)
+    if args.output:
+        save_results(results, args.output)
+    if args.compare:
+        comparison_df = compare_results(load_results(args.compare), results)
+        with pd.option_context("display.width", 200,
+                               "display.max_columns", None):
+            print(comparison_df.to_string(index=False))
+        if comparison_df.regression.any():
+            print("\nWARNING: regressions found against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Benchmarks how long importing each FDMBuilder module takes in a fresh python
+# process, and checks none of the heavy dependencies (pandas, numpy,
+# google-cloud-bigquery etc.) are loaded until they're used - run from the
+# root of the repo, e.g.:
+#
+#   python -m benchmarks.benchmark_import_time --max-seconds 0.2
+#
+# Exits with status 1 if any import is slower than --max-seconds or loads a
+# heavy dependency, so can be used to stop startup time creeping back up.
+
+BENCHMARK_MODULES = ["FDMBuilder.date_helpers", "FDMBuilder.FDM_helpers",
+                     "FDMBuilder.FDMTable", "FDMBuilder.FDMDataset"]
+HEAVY_MODULES = ["pandas", "numpy", "dateutil.parser", "google.cloud.bigquery",
+                 "google.api_core.exceptions", "pyarrow"]
+IMPORT_TIME_SCRIPT = """
+import importlib.util
+import json
+import sys
+import time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+loaded = [name for name in {heavy_modules!r}
+          if name in sys.modules
+          and not isinstance(sys.modules[name], importlib.util._LazyModule)]
+print(json.dumps({{"seconds": seconds, "heavy_modules_loaded": loaded}}))
+"""
+
+
+def time_import(module, repeats=5):
+    """Times importing a module in fresh python processes
+
+    Args:
+        module: string, name of the module to import
+        repeats: int (default 5), number of processes timed
+
+    Returns:
+        dict, with the module, median import seconds and any of HEAVY_MODULES
+            the import loaded
+    """
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = IMPORT_TIME_SCRIPT.format(module=module,
+                                       heavy_modules=HEAVY_MODULES)
+    timings = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", script], cwd=package_dir,
+                                capture_output=True, text=True, check=True)
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        timings.append(result["seconds"])
+    return {"module": module,
+            "seconds": statistics.median(timings),
+            "heavy_modules_loaded": result["heavy_modules_loaded"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark how long importing FDMBuilder takes"
+    )
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="fresh processes timed per module")
+    parser.add_argument("--max-seconds", type=float,
+                        help="fail if any import takes longer than this")
+    parser.add_argument("--output", help="JSON file to write results to")
+    args = parser.parse_args()
+
+    results = [time_import(module, args.repeats) for module in BENCHMARK_MODULES]
+    failed = False
+    for result in results:
+        heavy_modules = ", ".join(result["heavy_modules_loaded"]) or "none"
+        print(f"{result['module']:<26}{result['seconds']:>8.3f} s   "
+              f"heavy modules loaded: {heavy_modules}")
+        too_slow = (args.max_seconds is not None and
+                    result["seconds"] > args.max_seconds)
+        failed = failed or too_slow or bool(result["heavy_modules_loaded"])
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if failed:
+        print("\nWARNING: imports are slower than expected or load heavy "
+              "dependencies eagerly")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import re
+
+import pytest
+
+from FDMBuilder.FDM_helpers import (_get_referenced_names, _split_select_list,
+                                    build_column_operations_sql)
+
+TABLE_SQL = "`project_id.dataset_id.table_id`"
+
+
+def select_list(sql):
+    """Splits the outer select list of a compiled query into its items"""
+    match = re.match(r"\s*SELECT (.*?)\n\s*FROM (.*)", sql, re.DOTALL)
+    return [item.strip() for item in match.group(1).split(",\n")]
+
+
+def test_split_select_list_ignores_nested_and_quoted_commas():
+    items = _split_select_list(
+        'CONCAT(a, ", ", b) AS c, ARRAY[1, 2][OFFSET(0)] AS d, \'x,y\' AS e,'
+    )
+    assert items == ['CONCAT(a, ", ", b) AS c',
+                     "ARRAY[1, 2][OFFSET(0)] AS d",
+                     "'x,y' AS e"]
+
+
+def test_referenced_names_skip_strings_and_unquote_names():
+    names = _get_referenced_names('CONCAT(A, "b c", `my col`) ')
+    assert names == {"concat", "a", "my col"}
+
+
+def test_operations_keep_column_order():
+    sql = build_column_operations_sql(
+        TABLE_SQL, ["a", "b", "c"],
+        [("add", "a * 2 AS a_x_2"), ("drop", "b"), ("rename", {"c": "d"})]
+    )
+    assert select_list(sql) == ["a", "c AS d", "a * 2 AS a_x_2"]
+    assert sql.strip().endswith(f"FROM {TABLE_SQL}")
+
+
+def test_rename_then_drop_and_swap():
+    sql = build_column_operations_sql(
+        TABLE_SQL, ["a", "b", "c"],
+        [("rename", {"a": "b", "b": "a"}), ("drop", "c")]
+    )
+    assert select_list(sql) == ["a AS b", "b AS a"]
+
+
+def test_add_using_changed_column_uses_subquery():
+    sql = build_column_operations_sql(
+        TABLE_SQL, ["a", "b"],
+        [("rename", {"a": "x"}), ("add", "x + 1 AS y")]
+    )
+    assert select_list(sql) == ["x", "b", "x + 1 AS y"]
+    assert "SELECT a AS x,\nb\nFROM " + TABLE_SQL in sql
+
+
+def test_add_accepts_quoted_alias():
+    sql = build_column_operations_sql(
+        TABLE_SQL, ["a"], [("add", "a * 2 AS `a x 2`"), ("drop", "`a x 2`")]
+    )
+    assert select_list(sql) == ["a"]
+
+
+def test_rename_rejects_duplicate_new_names():
+    with pytest.raises(ValueError):
+        build_column_operations_sql(TABLE_SQL, ["a", "b"],
+                                    [("rename", {"a": "x", "b": "X"})])
+
+
+@pytest.mark.parametrize("operations", [
+    [("rename", {"a": "b"})],
+    [("add", "1 AS A")],
+    [("drop", "z")],
+    [("add", "a * 2")],
+    [("drop", "a"), ("drop", "b")],
+])
+def test_invalid_operations_raise(operations):
+    with pytest.raises(ValueError):
+        build_column_operations_sql(TABLE_SQL, ["a", "b"], operations)